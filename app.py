@@ -1,24 +1,29 @@
 import re
 import asyncio
-import json
 import os
 import calendar
+from contextlib import aclosing
 import keyboards as kb 
 from datetime import datetime
-from num2words import num2words
 from config import BOT_TOKEN, ALLOWED_USERS, ADMIN_ID
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, FSInputFile, ReplyKeyboardRemove, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from aiogram.types import Message, BufferedInputFile, ReplyKeyboardRemove, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from docling_qa import ask_ai_from_pdf
-from docling_qa2 import ask_ai_from_pdf2
-from docx_replacer import fill_doc
-from parse_pko_new_version import parse_contract_data_from_pdf, parse_active_total
-from parse_pko_old_ru_version import parse_old_ru_contract_data_from_pdf, parse_old_ru_total_contracts
-from parse_pko_old_kz_version import parse_pko_old_kz_version, parse_old_kz_total_contracts
-from parse_pro_green_ru_version import parse_old_green_ru_total_contracts, parse_pko_green_ru_version
+from docling_qa2 import ask_ai_from_pdf2_async, close_async_client
+from llm_scheduler import llm_scheduler
+from client_extractor import CLIENT_FIELDS, extract_client_data
+from docx_replacer import render_batch
+from letters_archive import LettersArchive, LETTERS_ZIP_THRESHOLD
+from pko_engine import LAYOUTS, index_document, parse_document
+from pko_document import PkoDocument
+from executors import run_cpu, run_io, shutdown as shutdown_executors
+from pko_cache import pko_cache, file_digest, bytes_digest, text_digest
+from company_registry import registry
+from contract import amount_in_words, format_amount
+from pko_version import detect_pko_version
 from datetime import datetime
 import unicodedata
 from utils import add_user, is_user_allowed, get_user_list, remove_user
@@ -30,6 +35,12 @@ from datetime import datetime, timedelta
 
 
 
+# PDF до этого размера скачивается в память, больше — во временный файл (.env)
+PDF_MEMORY_LIMIT = int(os.getenv("PDF_MEMORY_MAX_MB", "20")) * 1024 * 1024
+
+# Разобранный ПКО вытеснен из pko_cache (PKO_CACHE_MAX_MB, PKO_CACHE_MAX_AGE_DAYS)
+PKO_EXPIRED = "⚠️ Разобранный ПКО уже удалён из кеша. Пожалуйста, отправьте PDF-файл заново."
+
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
@@ -45,6 +56,7 @@ class BatchProcess(StatesGroup):
     file_path = State()
     user_text = State()
     mfo_list = State()
+    confirm_mfo = State()
     reason = State()
     attached_documents = State()
     file_version = State()
@@ -80,6 +92,21 @@ async def list_users(message: Message):
     await message.answer(text, parse_mode="HTML")
 
 
+@dp.message(Command("llm_stats"))
+async def llm_stats(message: Message):
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    stats = llm_scheduler.stats()
+    text = "📈 <b>Очередь запросов к OpenAI:</b>\n\n"
+    for name, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        text += f"• {name}: <code>{value}</code>\n"
+
+    await message.answer(text, parse_mode="HTML")
+
+
 @dp.message(F.text.startswith("/remove_"))
 async def remove_user_command(message: Message):
     if message.from_user.id != ADMIN_ID:
@@ -164,11 +191,6 @@ async def deny_access(callback: CallbackQuery):
 
 
 
-def remove_cents(value: str) -> str:
-            # Удаляет копейки после точки или запятой
-            return re.sub(r'[.,]\d{1,2}$', '', value)
-    
-
 def clean(name: str) -> str:
     # Убираем невидимые символы Unicode (все категории "Cf" — форматирующие)
     name = ''.join(ch for ch in name if unicodedata.category(ch) != 'Cf')
@@ -176,19 +198,16 @@ def clean(name: str) -> str:
     return re.sub(r"[ \t\u00A0]+", "", name).strip().lower()
 
 
-def get_current_date_str():
-    return datetime.now().strftime("%d.%m.%Y")
+def safe_filename(name: str) -> str:
+    # Номера договоров бывают с «/» — в имени файла такие символы заменяем
+    return re.sub(r'[\\/:*?"<>|]', '_', name)
 
 
-def get_term_by_amount(amount_str):
-    # Удаляем все пробелы и валюты, только цифры
-    digits_only = ''.join(filter(str.isdigit, amount_str))
-    
-    if not digits_only:
-        return "❌ Некорректная сумма"
+def get_current_date_str():
+    return datetime.now().strftime("%d.%m.%Y")
 
-    amount = int(digits_only)
 
+def get_term_by_amount(amount: int):
     if amount < 100_000:
         return "от 3 до 6 месяцев"
     elif amount < 150_000:
@@ -197,28 +216,102 @@ def get_term_by_amount(amount_str):
         return "от 12 до 24 месяцев"
 
 
-# Функция для загрузки данных из файла JSON
-def load_companies_db():
-    try:
-        with open("companies_db.json", "r", encoding="utf-8") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        print("Файл companies_db.json не найден.")
-        return []
-    except json.JSONDecodeError:
-        print("Ошибка при разборе JSON.")
-        return []
-
-def normalize_string(s):
-    return re.sub(r'\s+', '', s).lower()  # удаляет ВСЕ пробельные символы и приводит к нижнему регистру
-
-def find_company_by_trade_name(trade_name):
-    normalized_trade_name = normalize_string(trade_name)
-    companies_data = load_companies_db()
-    for company in companies_data:
-        if normalize_string(company["trade_name"]) == normalized_trade_name:
-            return company
-    return None
+def resolve_mfo_names(mfo_names):
+    """Сопоставляет введённые названия МФО с базой.
+
+    Возвращает (пары, на подтверждение, не найденные). Пары — (введённое
+    название, trade_name) в порядке ввода; у неуверенных совпадений trade_name
+    пока None. На подтверждение — (номер пары, введённое название, похожие
+    trade_name): оператор выбирает один из них отдельно для каждого названия.
+    Не найденные — названия, на которые в базе нет ничего достаточно похожего.
+    """
+    mfos, pending, unknown = [], [], []
+    for mfo_name in mfo_names:
+        company, suggestions = registry.resolve(mfo_name)
+        if company is not None:
+            mfos.append((mfo_name, company["trade_name"]))
+        elif suggestions:
+            # Похожие названия есть, но уверенности нет — спросим оператора
+            pending.append((len(mfos), mfo_name, [suggestion["trade_name"] for _, suggestion in suggestions]))
+            mfos.append((mfo_name, None))
+        else:
+            unknown.append(mfo_name)
+    return mfos, pending, unknown
+
+
+def client_replacements(user_data, reason, attached_documents):
+    """Поля шаблона письма, общие для всей пачки клиента."""
+    return {
+        "fullName": user_data.get("fullName") or "",
+        "address": user_data.get("address") or "",
+        "phone": user_data.get("phone") or "",
+        "email": user_data.get("email") or "",
+        "shortName": user_data.get("shortName") or "",
+        "reason": reason,
+        "attached_documents": attached_documents,
+        "date_now": get_current_date_str(),
+        "concluded": "заключил" if user_data.get("isMale") == True else "заключила"
+    }
+
+def contract_replacements(contract, company):
+    """Поля шаблона письма, зависящие от договора и МФО."""
+    claim_amount = int(contract.claim_amount)
+
+    return {
+        "IIN": contract.iin,
+        "receiver": company["details"]["to"],
+        "mfoAddress": company["details"]["address"],
+        "bin": company["details"]["bin"],
+        "mfoEmail": company["details"]["email"],
+        "contract_number": contract.number,
+        "contract_start_date": contract.start_date.strftime("%d.%m.%Y"),
+        "contract_amount": f"{format_amount(contract.total_amount)} ({amount_in_words(int(contract.total_amount))})",
+        "outstanding_amount": f"{format_amount(contract.claim_amount)} ({amount_in_words(claim_amount)})",
+        "date_diff": calculate_date_diff(contract.start_date, contract.end_date),
+        "term": get_term_by_amount(claim_amount),
+    }
+
+
+def match_all_creditors(contract_index, normalize):
+    """Режим «все известные МФО»: сопоставляет каждый договор с базой.
+
+    Возвращает (письма, не сопоставленные, пропущенные). Письма — список
+    (название для файла, компания, договор); в остальных списках — договоры.
+    Договор пропускается, если в нём упомянуты разные известные компании.
+    """
+    companies_by_key = {}
+    for search_field in registry.search_fields:
+        companies_by_key.setdefault(normalize(search_field), registry.by_search_field(search_field)[0])
+
+    letters, unmatched, skipped = [], [], []
+    for contract, keys in contract_index.with_creditors():
+        # Ключ внутри другого найденного ключа («cash» в «microcash») — не второй
+        # кредитор, а часть более длинного названия
+        keys = [key for key in keys if not any(key != other and key in other for other in keys)]
+        companies = {}
+        for key in keys:
+            # База могла измениться после построения индекса
+            company = companies_by_key.get(key)
+            if company is not None:
+                companies[company["details"]["bin"]] = company
+        if not companies:
+            unmatched.append(contract)
+        elif len(companies) > 1:
+            skipped.append(contract)
+        else:
+            company = next(iter(companies.values()))
+            letters.append((company["trade_name"], company, contract))
+
+    # Если у одной МФО несколько договоров — различаем файлы по номеру договора
+    counts = {}
+    for name, _, _ in letters:
+        counts[name] = counts.get(name, 0) + 1
+    letters = [
+        (f"{name} {safe_filename(str(contract.number))}" if counts[name] > 1 else name, company, contract)
+        for name, company, contract in letters
+    ]
+    return letters, unmatched, skipped
+
 
 def pluralize(value, one, few, many):
     # Функция для склонения слова в зависимости от числа
@@ -231,9 +324,7 @@ def pluralize(value, one, few, many):
     else:
         return many
 
-def calculate_date_diff(start_date_str, end_date_str):
-    start_date = datetime.strptime(start_date_str, "%d.%m.%Y")
-    end_date = datetime.strptime(end_date_str, "%d.%m.%Y")
+def calculate_date_diff(start_date, end_date):
     
     if end_date < start_date:
         return "❌ Конечная дата раньше начальной"
@@ -285,54 +376,164 @@ async def handle_pdf_with_text(message: Message, state: FSMContext, **kwargs):
         await message.answer("❗ Пожалуйста, добавьте описание к PDF-файлу.")
         return
 
-    file_path = f"temp/{message.from_user.id}_{document.file_name}"
-    file = await bot.get_file(document.file_id)
-    await bot.download_file(file.file_path, destination=file_path)
+    # PDF (в памяти или, если очень большой, во temp/) нужен только здесь: текст
+    # страниц сразу извлекается в PkoDocument и кладётся в pko_cache по хешу
+    # содержимого. В состоянии FSM — только хеш, так что брошенный на полпути
+    # диалог не держит файл. Повторно присланный ПКО заново не разбирается
+    pdf = None
+    try:
+        if (document.file_size or 0) <= PDF_MEMORY_LIMIT:
+            pdf = (await bot.download(document)).getvalue()
+            pdf_hash = bytes_digest(pdf)
+        else:
+            pdf = f"temp/{message.from_user.id}_{document.file_name}"
+            await bot.download(document, destination=pdf)
+            pdf_hash = await run_io(file_digest, pdf)
+        cached = await run_io(pko_cache.get, pdf_hash) or {}
+        pko = cached.get("pko")
+        if pko is None:
+            pko = await run_cpu(PkoDocument, pdf)
+            await run_io(pko_cache.update, pdf_hash, pko=pko)
+    except Exception as e:
+        await message.answer(f"⚠️ Ошибка при чтении PDF: {e}")
+        return
+    finally:
+        if isinstance(pdf, str):
+            try:
+                os.remove(pdf)
+            except OSError as e:
+                print(f"Не удалось удалить файл {pdf}: {e}")
+
+    # Исходный ПКО потом пересылается по file_id — без повторной загрузки
+    await state.update_data(user_text=message.caption.strip(), pdf_hash=pdf_hash, pdf_file_id=document.file_id)
+
+    # Версию определяем по первым страницам; спрашиваем, только если не получилось
+    file_version = cached.get("version") or detect_pko_version(pko)
+    if file_version:
+        await state.update_data(file_version=file_version)
+        await state.set_state(BatchProcess.mfo_list)
+        await message.answer(f"🔎 Версия файла: {file_version}")
+        await message.answer("📋 Введите список торговых названий, каждое с новой строки, или выберите «Все известные МФО»:", reply_markup=kb.all_creditors)
+        return
 
-    await state.update_data(user_text=message.caption.strip(), file_path=file_path)
     await state.set_state(BatchProcess.file_version)
-    await message.answer("📋 Выберите версию файла:", reply_markup=kb.select_file_version)
+    await message.answer("📋 Не удалось определить версию. Выберите версию файла:", reply_markup=kb.select_file_version)
 
 
 
 @dp.message(BatchProcess.file_version)
 async def handle_choose_file_version(message: Message, state: FSMContext):
-    if message.text not in ["Новая версия(рус)", "Старая версия(рус)", "Зеленая версия(каз)", "Зеленая версия(рус)"]:
+    if message.text not in LAYOUTS:
         await message.answer("Нет такого варианта", reply_markup=ReplyKeyboardRemove())
         return
     
     await state.update_data(file_version=message.text)
 
     await state.set_state(BatchProcess.mfo_list)
-    await message.answer("📋 Введите список торговых названий, каждое с новой строки:", reply_markup=ReplyKeyboardRemove())
+    await message.answer("📋 Введите список торговых названий, каждое с новой строки, или выберите «Все известные МФО»:", reply_markup=kb.all_creditors)
 
 @dp.message(BatchProcess.mfo_list)
 async def handle_mfo_list(message: Message, state: FSMContext):
-    raw_mfos = message.text.splitlines()
+    # «Все известные МФО» — письма по каждому договору, кредитор которого есть в базе
+    all_creditors = message.text.strip() == kb.ALL_CREDITORS
+    raw_mfos = [] if all_creditors else message.text.splitlines()
     mfo_names = [clean(name) for name in raw_mfos if clean(name)]
 
-    await state.update_data(mfo_names=mfo_names)
-    await state.set_state(BatchProcess.reason)
-    data = await state.get_data()
+    mfos, pending, unknown = resolve_mfo_names(mfo_names)
+    for mfo_name in unknown:
+        await message.answer(f"⚠️ Не найдено в Базе данных: {mfo_name}")
+    for mfo_name, trade_name in mfos:
+        if trade_name is not None and clean(trade_name) != mfo_name:
+            await message.answer(f"🔎 {mfo_name} → {trade_name}")
 
-    await message.answer("📄 Пожалуйста, напишите причину. Пример:")
-    if data["file_version"] == "Новая версия(рус)":
+    if not all_creditors and not mfos:
+        await state.set_state(BatchProcess.mfo_list)
+        await message.answer("📋 Ни одно название не найдено в базе. Введите список ещё раз:", reply_markup=kb.all_creditors)
+        return
 
-        await message.answer(f"""В настоящее время финансовое положение очень затруднительное в связи с долговой нагрузкой. Я прилагаю все усилия, чтобы решить свою финансовую ситуацию, однако, в силу ряда объективных причин, в том числе значительных затрат на базовые жизненные нужды, я не в состоянии полностью выплатить всю сумму займов единым платежом. Дополнительно имею {parse_active_total(data["file_path"])} действующих кредитных обязательств.""")
+    await state.update_data(mfos=mfos, pending_mfos=pending, all_creditors=all_creditors)
+    await ask_next_mfo(message, state)
 
-    elif data["file_version"] == "Старая версия(рус)":
 
-        await message.answer(f"""В настоящее время финансовое положение очень затруднительное в связи с долговой нагрузкой. Я прилагаю все усилия, чтобы решить свою финансовую ситуацию, однако, в силу ряда объективных причин, в том числе значительных затрат на базовые жизненные нужды, я не в состоянии полностью выплатить всю сумму займов единым платежом. Дополнительно имею {parse_old_ru_total_contracts(data["file_path"])} действующих кредитных обязательств.""")
+async def ask_next_mfo(message: Message, state: FSMContext):
+    """Спрашивает о следующем неуверенном названии; когда все разобраны — переходит к причине."""
+    data = await state.get_data()
+    if data["pending_mfos"]:
+        # Неуверенное совпадение могло указать на другую МФО — письмо не
+        # рендерим, пока оператор не выберет компанию для этого названия
+        _, mfo_name, candidates = data["pending_mfos"][0]
+        await state.set_state(BatchProcess.confirm_mfo)
+        await message.answer(
+            f"❓ «{mfo_name}» нет в базе. Выберите МФО, пришлите название ещё раз или нажмите «{kb.SKIP_MFO}»:",
+            reply_markup=kb.mfo_candidates(candidates),
+        )
+        return
 
+    # Пропущенные названия в письма не попадают
+    mfos = [(mfo_name, trade_name) for mfo_name, trade_name in data["mfos"] if trade_name is not None]
+    if not data["all_creditors"] and not mfos:
+        await state.set_state(BatchProcess.mfo_list)
+        await message.answer("📋 Не выбрано ни одной МФО. Введите список ещё раз:", reply_markup=kb.all_creditors)
+        return
+    await state.update_data(mfos=mfos)
+    await ask_reason(message, state)
 
-    elif data["file_version"] == "Зеленая версия(каз)":
 
-        await message.answer(f"""В настоящее время финансовое положение очень затруднительное в связи с долговой нагрузкой. Я прилагаю все усилия, чтобы решить свою финансовую ситуацию, однако, в силу ряда объективных причин, в том числе значительных затрат на базовые жизненные нужды, я не в состоянии полностью выплатить всю сумму займов единым платежом. Дополнительно имею {parse_old_kz_total_contracts(data["file_path"])} действующих кредитных обязательств.""")
+@dp.message(BatchProcess.confirm_mfo)
+async def handle_confirm_mfo(message: Message, state: FSMContext):
+    data = await state.get_data()
+    (position, mfo_name, candidates), *pending = data["pending_mfos"]
+    choice = message.text.strip()
 
+    if choice == kb.SKIP_MFO:
+        trade_name = None
+    elif choice in candidates:
+        trade_name = choice
+    else:
+        # Прислано другое написание — сопоставляем его заново
+        company, suggestions = registry.resolve(clean(choice))
+        if company is None:
+            if suggestions:
+                candidates = [suggestion["trade_name"] for _, suggestion in suggestions]
+            await state.update_data(pending_mfos=[(position, mfo_name, candidates), *pending])
+            await message.answer(f"⚠️ Точного совпадения для «{choice}» нет.")
+            await ask_next_mfo(message, state)
+            return
+        trade_name = company["trade_name"]
+
+    mfos = list(data["mfos"])
+    mfos[position] = (mfo_name, trade_name)
+    await state.update_data(mfos=mfos, pending_mfos=pending)
+    await ask_next_mfo(message, state)
+
+
+async def ask_reason(message: Message, state: FSMContext):
+    await state.set_state(BatchProcess.reason)
+    data = await state.get_data()
 
-    elif data["file_version"] == "Зеленая версия(рус)":
+    await message.answer("📄 Пожалуйста, напишите причину. Пример:", reply_markup=ReplyKeyboardRemove())
+    try:
+        # Договоры разбираем один раз (в пуле процессов): этот же документ с индексом
+        # договоров дальше используют подсчёт, поиск договоров и данные клиента
+        version = data["file_version"]
+        cached = await run_io(pko_cache.get, data["pdf_hash"]) or {}
+        pko = cached.get("pko")
+        if pko is None:
+            await state.clear()
+            await message.answer(PKO_EXPIRED)
+            return
+        if cached.get("version") == version and "active_total" in cached and LAYOUTS[version].has_index(pko):
+            # Этот ПКО в этой версии уже разбирали — индекс и подсчёт есть в кеше
+            active_total = cached["active_total"]
+        else:
+            # Подсчёт по всему тексту (старая версия) и индекс — тоже в пуле, не в event loop
+            pko, active_total = await run_cpu(index_document, pko, version)
+            await run_io(pko_cache.update, data["pdf_hash"], version=version, pko=pko, active_total=active_total)
+    except Exception as e:
+        await message.answer(f"⚠️ Ошибка при разборе PDF: {e}")
+        return
 
-        await message.answer(f"""В настоящее время финансовое положение очень затруднительное в связи с долговой нагрузкой. Я прилагаю все усилия, чтобы решить свою финансовую ситуацию, однако, в силу ряда объективных причин, в том числе значительных затрат на базовые жизненные нужды, я не в состоянии полностью выплатить всю сумму займов единым платежом. Дополнительно имею {parse_old_green_ru_total_contracts(data["file_path"])} действующих кредитных обязательств.""")
+    await message.answer(f"""В настоящее время финансовое положение очень затруднительное в связи с долговой нагрузкой. Я прилагаю все усилия, чтобы решить свою финансовую ситуацию, однако, в силу ряда объективных причин, в том числе значительных затрат на базовые жизненные нужды, я не в состоянии полностью выплатить всю сумму займов единым платежом. Дополнительно имею {active_total} действующих кредитных обязательств.""")
 
 
 
@@ -356,9 +557,8 @@ async def handle_attached_documents(message: Message, state: FSMContext):
     data = await state.get_data()
     await state.clear()
 
-    file_path = data["file_path"]
     user_text = data["user_text"]
-    mfo_names = data["mfo_names"]
+    mfos = data["mfos"]
     reason = data["reason"]
     attached_documents = data["attached_documents"]
 
@@ -366,94 +566,103 @@ async def handle_attached_documents(message: Message, state: FSMContext):
 
     try:
 
-        response = ask_ai_from_pdf2(file_path, user_text)
-        user_data = json.loads(response)
-
-        for mfo_name in mfo_names:
-
-            company = find_company_by_trade_name(mfo_name)
+        # Если этот PDF уже разбирали — берём документ, индекс договоров
+        # и данные клиента из кеша
+        pdf_hash = data["pdf_hash"]
+        cached = await run_io(pko_cache.get, pdf_hash) or {}
+
+        # Документ с индексом договоров разобран при выборе МФО
+        pko = cached.get("pko")
+        if pko is None:
+            await status_msg.edit_text(PKO_EXPIRED)
+            return
+        layout = LAYOUTS[data["file_version"]]
+        if not layout.has_index(pko):
+            # База МФО изменилась после разбора — индекс перестраивается в пуле
+            pko = await run_cpu(parse_document, pko, data["file_version"])
+        contract_index = layout.contract_index(pko)
+
+        # Данные клиента зависят и от подписи, поэтому кешируются по её хешу
+        client_data = cached.get("client_data", {})
+        caption_hash = text_digest(user_text)
+        # В кеше — только найденные поля: то, что модель не нашла, при повторной
+        # отправке того же PDF спрашиваем снова
+        user_data = client_data.get(caption_hash)
+        if user_data is None:
+            # ФИО, контакты и пол сначала ищем сами в подписи и на первой странице;
+            # модель спрашиваем только о том, что найти не удалось
+            user_data, missing = extract_client_data(pko.first_page, user_text)
+        else:
+            user_data = dict(user_data)
+            missing = [field for field in CLIENT_FIELDS if field not in user_data]
+        if missing:
+            user_data.update(await ask_ai_from_pdf2_async(
+                pko, user_text, missing, user=message.from_user.id, key=(pdf_hash, caption_hash)))
+        client_data = {**client_data, caption_hash: {field: value for field, value in user_data.items() if value is not None}}
+
+        await run_io(pko_cache.update, pdf_hash, version=data["file_version"], pko=pko, client_data=client_data)
+
+        # Письма: (название МФО для файла, компания, договор)
+        letters = []
+        if data.get("all_creditors"):
+            letters, unmatched, skipped = match_all_creditors(contract_index, LAYOUTS[data["file_version"]].creditor_normalize)
+            summary = f"📊 Договоров: {len(contract_index)}. Писем: {len(letters)}."
+            if unmatched:
+                summary += "\nКредитор не найден в базе: " + ", ".join(str(c.number) for c in unmatched)
+            if skipped:
+                summary += "\nПропущено (несколько МФО в договоре): " + ", ".join(str(c.number) for c in skipped)
+            await message.answer(summary)
+
+        # Названия сопоставлены с базой (и подтверждены оператором) при вводе списка
+        for mfo_name, trade_name in mfos:
+
+            company = registry.by_trade_name(trade_name)
             if not company:
                 await message.answer(f"⚠️ Не найдено в Базе данных: {mfo_name}")
                 continue
-            
-
 
-            # тут нужно сдлеать выбор парсера в зависимости от выбранного типпа
-            if data["file_version"] == "Новая версия(рус)":
-                result = parse_contract_data_from_pdf(file_path, company_name=company["search_field"])
-            elif data["file_version"] == "Старая версия(рус)":
-                result = parse_old_ru_contract_data_from_pdf(file_path, company_name=company["search_field"])
-            elif data["file_version"] == "Зеленая версия(каз)":
-                result = parse_pko_old_kz_version(file_path, company_name=company["search_field"])
-            elif data["file_version"] == "Зеленая версия(рус)":
-                result = parse_pko_green_ru_version(file_path, company_name=company["search_field"])
-                    
+            result = contract_index.find(company["search_field"])
 
             if not result:
                 await message.answer(f"❌ Контракт не найден в пко для: {mfo_name}")
                 continue
 
-            
-            credit_total = re.sub(r'\s*KZT$', '', result["Общая сумма кредита"])
-            credit_total_no_cents = remove_cents(credit_total)
-            credit_total_int = int(credit_total_no_cents.replace(" ", ""))
-            credit_total_words = num2words(credit_total_int, lang='ru')
-            result["Общая сумма кредита"] = f"{credit_total_no_cents} ({credit_total_words})"
-
-            credit_str = re.sub(r'\s*KZT$', '', result["Непогашенная сумма по кредиту"])
-            overdue_str = re.sub(r'\s*KZT$', '', result["Сумма просроченных взносов"])
-            credit_val = float(credit_str.replace(" ", "").replace(",", "."))
-            overdue_val = float(overdue_str.replace(" ", "").replace(",", "."))
-
-            chosen_str = credit_str if credit_val >= overdue_val else overdue_str
-            chosen_str_no_cents = remove_cents(chosen_str)
-            chosen_int = int(chosen_str_no_cents.replace(" ", ""))
-            chosen_words = num2words(chosen_int, lang='ru')
-
-            result["Непогашенная сумма по кредиту"] = f"{chosen_str_no_cents} ({chosen_words})"
-            result["Сумма просроченных взносов"] = remove_cents(overdue_str)
-
-            date_diff = calculate_date_diff(result["Дата начала"], result["Дата окончания"])
-
-            replacements = {
-                "fullName": user_data["fullName"],
-                "IIN": result["ИИН"],
-                "address": user_data["address"],
-                "phone": user_data["phone"],
-                "email": user_data["email"],
-                "receiver": company["details"]["to"],
-                "mfoAddress": company["details"]["address"],
-                "bin": company["details"]["bin"],
-                "mfoEmail": company["details"]["email"],
-                "contract_number": result["Номер договора"],
-                "contract_start_date": result["Дата начала"],
-                "contract_amount": result["Общая сумма кредита"],
-                "outstanding_amount": result["Непогашенная сумма по кредиту"],
-                "shortName": user_data["shortName"],
-                "date_diff": date_diff,
-                "reason": reason,
-                "attached_documents": attached_documents,
-                "date_now": get_current_date_str(),
-                "term": get_term_by_amount(result["Непогашенная сумма по кредиту"]),
-                "concluded": "заключил" if user_data["isMale"] == True else "заключила"
-            }
-
-            doc_name = str(result.get("ИИН", "")) + "_" + mfo_name + ".docx"
-            doc_path = f"temp/{doc_name}"
-            filename = mfo_name + " " + "заявление на реестр" + " " + user_data["shortName"] + ".docx"
-
-            fill_doc("template.docx", doc_path, replacements)
-
-            original_file = FSInputFile(file_path, filename="1")
-            result_file = FSInputFile(doc_path, filename=filename)
-            await bot.send_document("-4753379582", original_file, caption=user_text)
-            await message.answer_document(result_file, caption=f"✅ Документ для: {mfo_name}")
-            # # Удаление временного файла
-            # try:
-            #     os.remove(doc_path)
-            #     os.remove(file_path)
-            # except Exception as e:
-            #     print(f"Не удалось удалить файл {doc_path}: {e}")
+            letters.append((mfo_name, company, result))
+
+        # Без дат договора письмо не собрать: такие договоры пропускаем, а не роняем всю пачку
+        complete = []
+        for mfo_name, company, result in letters:
+            if result.start_date is None or result.end_date is None:
+                await message.answer(f"⚠️ Не удалось прочитать даты договора {result.number} ({mfo_name}) — письмо пропущено")
+                continue
+            complete.append((mfo_name, company, result))
+        letters = complete
+
+        # Письма рендерятся в пуле процессов и отправляются по мере готовности
+        # (в памяти, без временных файлов). Большая пачка уходит одним ZIP
+        # с реестром договоров — одна отправка вместо N
+        shared = client_replacements(user_data, reason, attached_documents)
+        records = [contract_replacements(result, company) for _, company, result in letters]
+        archive = LettersArchive() if len(letters) > LETTERS_ZIP_THRESHOLD else None
+        # aclosing: при ошибке отправки рендер останавливается сразу, а не при сборке мусора
+        async with aclosing(render_batch("template.docx", shared, records)) as documents:
+            async for i, document in documents:
+                mfo_name, _, result = letters[i]
+                filename = mfo_name + " " + "заявление на реестр" + " " + (user_data.get("shortName") or "") + ".docx"
+
+                if archive is not None:
+                    archive.add(i, filename, document, mfo_name, result)
+                    continue
+
+                result_file = BufferedInputFile(document, filename=filename)
+                await bot.send_document("-4753379582", data["pdf_file_id"], caption=user_text)
+                await message.answer_document(result_file, caption=f"✅ Документ для: {mfo_name}")
+
+        if archive is not None:
+            zip_name = "заявления на реестр" + " " + (user_data.get("shortName") or "") + ".zip"
+            await bot.send_document("-4753379582", data["pdf_file_id"], caption=user_text)
+            await message.answer_document(BufferedInputFile(archive.getvalue(), filename=zip_name),
+                                          caption=f"✅ Документов: {len(archive)}")
         await message.answer("✅ Готово!")
         
 
@@ -483,7 +692,11 @@ async def cmd_start(message: Message):
 
     
 async def main():
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_async_client()
+        shutdown_executors()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
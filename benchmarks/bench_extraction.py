@@ -0,0 +1,92 @@
+"""Нагрузочный замер извлечения данных клиента (ask_ai_from_pdf2_async) без сети.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_extraction [--calls N] [--concurrency C] [--latency S]
+
+Поднимает benchmarks.fake_openai в фоновом потоке, направляет на него
+docling_qa2 через OPENAI_BASE_URL и прогоняет calls вызовов, не больше
+concurrency одновременно, на синтетическом ПКО (при желании — с долей
+ответов 500/429). Печатает перцентили задержки успешных вызовов, число
+и типы ошибок, пропускную способность и число запросов к API.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.bench_parsers import report
+from benchmarks.fake_openai import start
+from benchmarks.synthetic_pko import ROOT, VERSIONS, make_pko
+
+sys.path.insert(0, ROOT)
+
+
+async def run(docling_qa2, pko, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with semaphore:
+            start_time = time.perf_counter()
+            # Разные подписи — как разные операторы; страницы ПКО берутся из кеша эмбеддингов
+            await docling_qa2.ask_ai_from_pdf2_async(pko, f"Клиент №{i}, данные в ПКО")
+            samples.append((time.perf_counter() - start_time) * 1000)
+
+    start_time = time.perf_counter()
+    # Упавший вызов не прерывает замер — ошибки считаем по типам
+    results = await asyncio.gather(*(one(i) for i in range(calls)), return_exceptions=True)
+    elapsed = time.perf_counter() - start_time
+    await docling_qa2.close_async_client()
+    errors = Counter(type(result).__name__ for result in results if isinstance(result, BaseException))
+    return samples, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа заглушки, с")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_extraction_")
+    server = start(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                   rate_limit_rate=args.rate_limit_rate, retry_after=0.5)
+    os.environ.update({
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+    })
+    try:
+        import docling_qa2
+        from llm_scheduler import llm_scheduler
+        from pko_document import PkoDocument
+
+        path = os.path.join(workdir, "pko.pdf")
+        make_pko(VERSIONS[0], args.pages, args.pages // 2, path)
+        pko = PkoDocument(path)
+
+        samples, errors, elapsed = asyncio.run(run(docling_qa2, pko, args.calls, args.concurrency))
+        print(f"{args.calls} вызовов, по {args.concurrency} одновременно, {args.pages} стр., "
+              f"задержка API {args.latency:g} с")
+        if samples:
+            report("ask_ai_from_pdf2_async", samples)
+        failed = sum(errors.values())
+        print(f"  ошибки: {failed} из {args.calls}" + (f" ({dict(errors)})" if failed else ""))
+        print(f"  throughput {args.calls / elapsed:.1f} вызовов/с; запросы к API: {server.requests}")
+        print(f"  llm_scheduler: {llm_scheduler.stats()}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
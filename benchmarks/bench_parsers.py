@@ -0,0 +1,218 @@
+"""Бенчмарк разбора ПКО на синтетических отчётах всех четырёх версий.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parsers [--quick] [--repeat N]
+
+Замеряются parse_*_contract_data_from_pdf (поиск договора по каждой МФО пачки),
+функции подсчёта действующих договоров и весь цикл handle_attached_documents
+с заглушками вместо Telegram и OpenAI. Для каждого замера печатаются перцентили
+задержки, в конце — пиковый RSS процесса и пула.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+from benchmarks.synthetic_pko import ROOT, VERSIONS, make_pko
+
+sys.path.insert(0, ROOT)
+
+from pko_document import PkoDocument  # noqa: E402
+import parse_pko_new_version  # noqa: E402
+import parse_pko_old_ru_version  # noqa: E402
+import parse_pko_old_kz_version  # noqa: E402
+import parse_pro_green_ru_version  # noqa: E402
+
+PARSERS = {
+    "Новая версия(рус)": (parse_pko_new_version.parse_contract_data_from_pdf,
+                          parse_pko_new_version.parse_active_total),
+    "Старая версия(рус)": (parse_pko_old_ru_version.parse_old_ru_contract_data_from_pdf,
+                           parse_pko_old_ru_version.parse_old_ru_total_contracts),
+    "Зеленая версия(каз)": (parse_pko_old_kz_version.parse_pko_old_kz_version,
+                            parse_pko_old_kz_version.parse_old_kz_total_contracts),
+    "Зеленая версия(рус)": (parse_pro_green_ru_version.parse_pko_green_ru_version,
+                            parse_pro_green_ru_version.parse_old_green_ru_total_contracts),
+}
+
+SIZES = [(2, 1), (10, 10), (50, 30), (200, 100)]
+QUICK_SIZES = [(2, 1), (10, 10)]
+MFOS_PER_BATCH = 15
+
+CLIENT_DATA = {
+    "fullName": "Иванов Иван Иванович",
+    "shortName": "Иванов И.И.",
+    "email": "test@mail.ru",
+    "phone": "7 777 777 7777",
+    "address": "Астана, ул. Аксенгир дом 13 кв 1",
+    "isMale": True,
+}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if len(samples) == 1:
+        return samples * 3
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[89], cuts[98]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    p50, p90, p99 = percentiles(samples)
+    print(f"  {name:<28} p50 {p50:9.2f} ms   p90 {p90:9.2f} ms   p99 {p99:9.2f} ms")
+
+
+def mfo_batch(companies):
+    # Торговые названия для пачки: найденные в отчёте + одно отсутствующее
+    names = list(dict.fromkeys(company["trade_name"] for company in companies))[:MFOS_PER_BATCH - 1]
+    return names + ["несуществующаямфо"]
+
+
+# --- Заглушки Telegram для прогона обработчика пачки -------------------------
+
+class FakeStatus:
+    async def delete(self):
+        pass
+
+    async def edit_text(self, text, **kwargs):
+        raise RuntimeError(text)
+
+
+class FakeMessage:
+    def __init__(self, text):
+        self.text = text
+        self.from_user = types.SimpleNamespace(id=1)
+        self.documents = 0
+
+    async def answer(self, text, **kwargs):
+        return FakeStatus()
+
+    async def answer_document(self, document, **kwargs):
+        self.documents += 1
+
+
+class FakeState:
+    def __init__(self, data):
+        self.data = dict(data)
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        pass
+
+
+def load_app(workdir):
+    """Импортирует app с заглушками: без токена бота, OpenAI и кеша на диске."""
+    sys.modules.setdefault("config", types.SimpleNamespace(
+        BOT_TOKEN="123456:" + "A" * 35, ALLOWED_USERS=[], ADMIN_ID=0))
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    import app
+    from pko_cache import PkoCache
+
+    async def send_document(*args, **kwargs):
+        pass
+
+    async def ask_ai_from_pdf2_async(pko, question, fields=None, **kwargs):
+        return {field: CLIENT_DATA[field] for field in fields or CLIENT_DATA}
+
+    app.bot.send_document = send_document
+    app.ask_ai_from_pdf2_async = ask_ai_from_pdf2_async
+    app.pko_cache = PkoCache(os.path.join(workdir, "cache"), max_bytes=1 << 30, max_age=3600)
+    return app
+
+
+def bench_batch(app, path, version, mfo_names, repeat):
+    # Как в боте: PDF скачан в память
+    with open(path, "rb") as file:
+        pdf = file.read()
+    runs = iter(range(repeat))
+
+    async def run_once():
+        # Как при получении файла: текст страниц извлекается и кладётся в кеш,
+        # каждый прогон под новым хешем — без данных клиента от предыдущего
+        pdf_hash = f"benchmark-{next(runs)}"
+        app.pko_cache.update(pdf_hash, pko=PkoDocument(pdf))
+        state = FakeState({
+            "user_text": "Иванов Иван Иванович, тел. 77777777777", "pdf_file_id": "benchmark",
+            "mfos": app.resolve_mfo_names([app.clean(name) for name in mfo_names])[0], "reason": "Причина",
+            "file_version": version, "pdf_hash": pdf_hash,
+        })
+        message = FakeMessage("1) ПКО")
+        await app.handle_attached_documents(message, state)
+        return message.documents
+
+    samples = []
+    loop = asyncio.new_event_loop()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loop.run_until_complete(run_once())
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        loop.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="только маленькие отчёты")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-batch", action="store_true", help="без прогона обработчика пачки")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pko_bench_")
+    os.makedirs(os.path.join(workdir, "temp"))
+    for name in ("template.docx", "companies_db.json"):
+        shutil.copy(os.path.join(ROOT, name), workdir)
+    os.chdir(workdir)
+
+    app = None if args.no_batch else load_app(workdir)
+    try:
+        for version in VERSIONS:
+            find_contract, count_active = PARSERS[version]
+            for pages, contracts in (QUICK_SIZES if args.quick else SIZES):
+                path = os.path.join(workdir, f"{VERSIONS.index(version)}_{pages}_{contracts}.pdf")
+                companies = make_pko(version, pages, contracts, path)
+                search_fields = [company["search_field"] for company in companies][:MFOS_PER_BATCH]
+
+                print(f"{version}: {pages} стр., {contracts} догов.")
+                # Как в обработчике: PDF открывается один раз на пачку МФО
+                report("parse_*_contract_data", timed(
+                    lambda: [find_contract(pko, company_name=name)
+                             for pko in [PkoDocument(path)] for name in search_fields], args.repeat))
+                report("count active contracts", timed(lambda: count_active(path), args.repeat))
+                if app is not None:
+                    report("handle_attached_documents", bench_batch(
+                        app, path, version, mfo_batch(companies), args.repeat))
+    finally:
+        if app is not None:
+            app.shutdown_executors()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # ru_maxrss в Linux — в килобайтах
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"peak RSS: {own:.1f} MB (пул процессов: {children:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
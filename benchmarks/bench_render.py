@@ -0,0 +1,97 @@
+"""Бенчмарк рендера писем из template.docx: писем в секунду.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_render [--letters N]
+
+Сравниваются прежний fill_doc (новый DocxTemplate на каждое письмо),
+CachedDocxTemplate (шаблон разобран один раз) и SplicedTemplate (склейка
+document.xml без Jinja), затем — вся пачка через render_batch в пуле
+процессов против последовательного render_doc (рендерер выбирается
+DOCX_RENDERER). Данные писем — все переменные шаблона, заполненные
+разными значениями.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from docxtpl import DocxTemplate
+
+from benchmarks.bench_parsers import report
+from benchmarks.synthetic_pko import ROOT
+
+sys.path.insert(0, ROOT)
+
+from docx_replacer import CachedDocxTemplate, SplicedTemplate, render_batch, render_doc  # noqa: E402
+from executors import shutdown  # noqa: E402
+
+TEMPLATE = os.path.join(ROOT, "template.docx")
+
+
+def fill_doc_uncached(temp_path, out_path, data):
+    # Прежняя реализация: шаблон распаковывается и компилируется на каждое письмо
+    doc = DocxTemplate(temp_path)
+    doc.render(data)
+    doc.save(out_path)
+
+
+def letters(count):
+    keys = sorted(DocxTemplate(TEMPLATE).get_undeclared_template_variables())
+    return [{key: f"{key} {i}" for key in keys} for i in range(count)]
+
+
+def bench(name, render, batch, workdir):
+    samples = []
+    start = time.perf_counter()
+    for i, data in enumerate(batch):
+        letter_start = time.perf_counter()
+        render(TEMPLATE, os.path.join(workdir, f"{name}_{i}.docx"), data)
+        samples.append((time.perf_counter() - letter_start) * 1000)
+    elapsed = time.perf_counter() - start
+    report(name, samples)
+    print(f"  {'писем в секунду':<28} {len(batch) / elapsed:13.1f}")
+
+
+def bench_batch(batch):
+    async def collect():
+        return [document async for _, document in render_batch(TEMPLATE, {}, batch)]
+
+    start = time.perf_counter()
+    for data in batch:
+        render_doc(TEMPLATE, data)
+    sequential = time.perf_counter() - start
+
+    asyncio.run(collect())  # прогрев: шаблон загружается в каждом процессе пула
+    start = time.perf_counter()
+    asyncio.run(collect())
+    parallel = time.perf_counter() - start
+    print(f"  {'render_doc подряд':<28} {sequential * 1000:9.2f} ms")
+    print(f"  {'render_batch (пул)':<28} {parallel * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--letters", type=int, default=30)
+    args = parser.parse_args()
+
+    batch = letters(args.letters)
+    workdir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        print(f"{args.letters} писем")
+        bench("DocxTemplate per letter", fill_doc_uncached, batch, workdir)
+        cached = CachedDocxTemplate(TEMPLATE)
+        bench("CachedDocxTemplate", lambda _, out, data: cached.render_to(out, data), batch, workdir)
+        spliced = SplicedTemplate(TEMPLATE)
+        bench("SplicedTemplate", lambda _, out, data: spliced.render_to(out, data), batch, workdir)
+        print(f"пачка из {args.letters} писем, DOCX_RENDERER={os.getenv('DOCX_RENDERER', 'splice')}")
+        bench_batch(batch)
+    finally:
+        shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
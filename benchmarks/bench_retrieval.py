@@ -0,0 +1,65 @@
+"""Микробенчмарк выбора контекста (get_top_k_context) на случайных эмбеддингах.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_retrieval [--repeat N] [--dim D]
+
+Сравнивается прежняя реализация (cosine_similarity в цикле по спискам float
+и полная сортировка) с матричной: одно умножение нормированной матрицы на
+вектор запроса и argpartition.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from benchmarks.bench_parsers import report, timed
+from benchmarks.synthetic_pko import ROOT
+
+sys.path.insert(0, ROOT)
+
+from retrieval import normalize_rows, top_k  # noqa: E402
+
+PAGES = [10, 50, 200, 500]
+K = 5
+
+
+# --- Прежняя реализация из docling_qa ----------------------------------------
+
+def cosine_similarity(a, b):
+    a, b = np.array(a), np.array(b)
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def loop_top_k_context(chunks, vectors, query_embedding, k=K):
+    scored = [(text, cosine_similarity(vec, query_embedding)) for text, vec in zip(chunks, vectors)]
+    top = sorted(scored, key=lambda x: x[1], reverse=True)[:k]
+    return "\n\n".join([text for text, _ in top])
+
+
+def matrix_top_k_context(chunks, matrix, query_embedding, k=K):
+    return "\n\n".join(chunks[i] for i in top_k(matrix, query_embedding, k))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=3072, help="размерность (text-embedding-3-large — 3072)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for pages in PAGES:
+        chunks = [f"страница {i}" for i in range(pages)]
+        vectors = rng.standard_normal((pages, args.dim)).tolist()
+        query = rng.standard_normal(args.dim).tolist()
+        matrix = normalize_rows(vectors)
+
+        # Обе реализации должны выбирать одни и те же страницы
+        assert loop_top_k_context(chunks, vectors, query) == matrix_top_k_context(chunks, matrix, query)
+
+        print(f"{pages} стр., dim {args.dim}")
+        report("loop + sorted", timed(lambda: loop_top_k_context(chunks, vectors, query), args.repeat))
+        report("matvec + argpartition", timed(lambda: matrix_top_k_context(chunks, matrix, query), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
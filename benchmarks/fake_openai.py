@@ -0,0 +1,202 @@
+"""Локальная замена OpenAI API для тестов и нагрузочных замеров без сети.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fake_openai [--port 8765] [--latency 0.2] [--error-rate 0.05] [--rate-limit-rate 0.1]
+
+Бот и docling_qa* переключаются на неё через окружение (.env):
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+    OPENAI_API_KEY=любой
+
+Реализованы POST /v1/embeddings и POST /v1/chat/completions. Векторы
+детерминированы (зависят только от текста и размерности), ответ чата —
+заготовленный JSON с данными клиента; при response_format json_schema
+возвращаются только поля из схемы. Задержка, ошибки 500 и ответы 429
+с Retry-After настраиваются.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 3072
+
+CLIENT_REPLY = {
+    "fullName": "Иванов Иван Иванович",
+    "shortName": "Иванов И.И.",
+    "email": "test@mail.ru",
+    "phone": "7 777 777 7777",
+    "address": "Астана, ул. Аксенгир дом 13 кв 1",
+    "isMale": True,
+}
+
+
+def fake_embedding(text: str, dimensions: int = DEFAULT_DIMENSIONS):
+    """Детерминированный единичный вектор для текста."""
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def count_tokens(text: str) -> int:
+    # Грубая оценка, как у OpenAI для русского текста — около 4 символов на токен
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, reply=None, seed=0):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.reply = reply or CLIENT_REPLY
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {"embeddings": 0, "chat": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def roll(self):
+        """Задержка и исход запроса: None, 500 или 429."""
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            outcome = self.random.random()
+        time.sleep(delay)
+        if outcome < self.rate_limit_rate:
+            return 429
+        if outcome < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def count(self, name):
+        with self.lock:
+            self.requests[name] += 1
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, error_type, headers=()):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "code": None}}, headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self.send_error_json(400, "invalid JSON body", "invalid_request_error")
+
+        if self.path.endswith("/embeddings"):
+            handler, name = self.embeddings, "embeddings"
+        elif self.path.endswith("/chat/completions"):
+            handler, name = self.chat_completions, "chat"
+        else:
+            return self.send_error_json(404, f"unknown endpoint {self.path}", "invalid_request_error")
+        self.server.count(name)
+
+        outcome = self.server.roll()
+        if outcome == 429:
+            self.server.count("rate_limited")
+            return self.send_error_json(429, "Rate limit reached", "rate_limit_exceeded",
+                                        [("Retry-After", f"{self.server.retry_after:g}")])
+        if outcome == 500:
+            self.server.count("errors")
+            return self.send_error_json(500, "injected server error", "server_error")
+        self.send_json(200, handler(body))
+
+    def embeddings(self, body):
+        texts = body.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        dimensions = body.get("dimensions") or DEFAULT_DIMENSIONS
+        tokens = sum(count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+                     for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def chat_completions(self, body):
+        reply = self.server.reply
+        schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema")
+        if schema:
+            reply = {field: reply.get(field) for field in schema.get("properties", {})}
+        content = json.dumps(reply, ensure_ascii=False)
+        prompt_tokens = sum(count_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+        completion_tokens = count_tokens(content)
+        return {
+            "id": f"chatcmpl-fake-{self.server.requests['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+def start(port=0, **options) -> FakeOpenAI:
+    """Запускает сервер в фоновом потоке (port=0 — любой свободный); остановка — server.shutdown()."""
+    server = FakeOpenAI(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка каждого ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, до N с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After в ответах 429, с")
+    parser.add_argument("--reply", help="JSON-файл с ответом чата вместо CLIENT_REPLY")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    reply = None
+    if args.reply:
+        with open(args.reply, encoding="utf-8") as file:
+            reply = json.load(file)
+    server = FakeOpenAI(("127.0.0.1", args.port), latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                        retry_after=args.retry_after, reply=reply, seed=args.seed)
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Генерация синтетических ПКО во всех четырёх версиях для бенчмарков.
+
+Текст страниц повторяет метки, на которые опираются спецификации в pko_engine.LAYOUTS.
+"""
+import json
+import os
+import random
+import fitz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERSIONS = ("Новая версия(рус)", "Старая версия(рус)", "Зеленая версия(каз)", "Зеленая версия(рус)")
+CONTRACTS_PER_PAGE = 3
+
+
+def _contract(version, i, creditor):
+    number = f"{1000 + i}-KZ/{i}"
+    if version == "Новая версия(рус)":
+        return (f"Общая сумма кредита / валюта: {100 + i} 000,00 KZT\nКредитор: ТОО МФО «{creditor}»\n"
+                f"Номер договора: {number}\nДата начала срока действия договора: 01.02.2023\n"
+                f"Дата окончания срока действия договора: 15.0{1 + i % 9}.2024\nСОСТОЯНИЕ\n"
+                f"Сумма просроченных взносов: {i} 500,00 KZT\nНепогашенная сумма по кредиту: {90 + i} 000,50 KZT\n"
+                f"ЗАЛОГИ\n")
+    if version == "Старая версия(рус)":
+        return (f"Вид финансирования: Кредит\nКредитор: {creditor}\nНомер договора: {number}\nДата заявки: 01.01.2023\n"
+                f"Дата начала срока действия договора: 01.02.2023\nДата окончания срока действия договора: 15.03.2024\n"
+                f"Общая сумма кредита/валюта: {100 + i}000.00KZT\nСумма периодического платежа: {i}500.00KZT\n"
+                f"Непогашенная сумма по кредиту: {90 + i}000.50KZT\nДополнительная информация\n")
+    if version == "Зеленая версия(каз)":
+        return (f"Міндеттеме\nКредитор: «{creditor}»\nШарт нөмірі: {number}\nКредитке өтінім беру күні: 01.01.2023\n"
+                f"Келісімшарттың қолданылу мерзімінің басталу күні: 01.02.2023\n"
+                f"Келісімшарттың қолданылу мерзімінің аяқталу күні: 15.03.2024\n"
+                f"Ай сайынғы төлем сомасы / валюта: {10 + i} 000 KZT\nМерзімі өткен жарналар сомасы /валюта: {i} 000 KZT\n"
+                f"Алдағы төлемдер сомасы/валюта {50 + i} 000 KZT\nМерзімін ұзартулар күні\n")
+    return (f"Обязательство\nКредитор: «{creditor}»\nНомер договора: {number}\nДата заявки на кредит: 01.01.2023\n"
+            f"Дата начала срока действия контракта: 01.02.2023\nДата окончания срока действия контракта: 15.03.2024\n"
+            f"Сумма ежемесячного платежа /валюта: {10 + i} 000 KZT\nСумма просроченных взносов /валюта: {i} 000 KZT\n"
+            f"Сумма предстоящих платежей /валюта: {50 + i} 000 KZT\nДата пролонгации\n")
+
+
+# Первая страница, начало и конец блока действующих договоров
+_SECTIONS = {
+    "Новая версия(рус)": (
+        "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ\nИИН: 900101300123\n{n} Действующие договоры без просрочки*\n"
+        "0 Действующие договоры с просрочкой*\n",
+        "ДЕЙСТВУЮЩИЕ ДОГОВОРА\n", "ЗАВЕРШЕННЫЕ ДОГОВОРА\n"),
+    "Старая версия(рус)": (
+        "Кредитный отчет\nИванов Иван Иванович (ИИН) 900101300123\nЗаёмщик {n} (0)\n",
+        "Действующие договора\n", "Завершенные договора\n"),
+    "Зеленая версия(каз)": (
+        "ЖЕКЕ КРЕДИТТІК ЕСЕП\nЖСН: 900101300123\nҚолданыстағы міндеттемелер ({n})\n",
+        "ҚОЛДАНЫСТАҒЫ ШАРТТАР БОЙЫНША ТОЛЫҚ АҚПАРАТ\n", "АЯҚТАЛҒАН ШАРТТАР\n"),
+    "Зеленая версия(рус)": (
+        "ПЕРСОНАЛЬНЫЙ КРЕДИТНЫЙ ОТЧЕТ\nИИН: 900101300123\nДействующие обязательства ({n})\n",
+        "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ\n", "ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ\n"),
+}
+
+_FILLER = "Сведения о запросах кредитного отчета. Пользователь: банк. Дата запроса: 01.01.2024.\n" * 30
+
+
+def load_companies():
+    with open(os.path.join(ROOT, "companies_db.json"), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def make_pko(version, pages, contracts, path, seed=1):
+    """Пишет PDF в path и возвращает список компаний (из базы) по порядку договоров.
+
+    pages — желаемое число страниц; если договоры не помещаются, страниц будет больше.
+    """
+    rnd = random.Random(seed)
+    companies = [rnd.choice(load_companies()) for _ in range(contracts)]
+    first, start, end = _SECTIONS[version]
+
+    texts = [first.format(n=contracts), start]
+    for i, company in enumerate(companies):
+        if i and i % CONTRACTS_PER_PAGE == 0:
+            texts.append("")
+        texts[-1] += _contract(version, i, company["search_field"])
+    texts.append(end)
+    while len(texts) < pages:
+        texts.append(_FILLER)
+
+    doc = fitz.open()
+    for text in texts:
+        page = doc.new_page()
+        html = "<pre style='font-size:7px'>" + text.replace("&", "&amp;").replace("<", "&lt;") + "</pre>"
+        page.insert_htmlbox(fitz.Rect(20, 20, 590, 830), html)
+    doc.save(path)
+    doc.close()
+    return companies
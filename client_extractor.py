@@ -0,0 +1,165 @@
+import re
+from typing import Optional
+from pydantic import BaseModel, ValidationError, field_validator
+
+CLIENT_FIELDS = ("fullName", "shortName", "email", "phone", "address", "isMale")
+
+_MALE_SUFFIXES = ("ович", "евич", "ич", "улы", "ұлы", "оглы")
+_FEMALE_SUFFIXES = ("овна", "евна", "ична", "инична", "кызы", "қызы")
+
+_WORD = r"[А-ЯЁӘҒҚҢӨҰҮҺІа-яёәғқңөұүһі-]+"
+# Фамилия Имя Отчество — отчество узнаём по окончанию (в т.ч. «… улы», «… кызы» отдельным словом)
+_FULL_NAME = re.compile(
+    rf"\b({_WORD})[ \t]+({_WORD})[ \t]+({_WORD}(?:(?:ович|евич|овна|евна|ична|ич)\b|[ \t-]+(?:улы|ұлы|кызы|қызы|оглы)\b|(?:улы|ұлы|кызы|қызы)\b))",
+    re.IGNORECASE,
+)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"(?<!\d)(?:\+?7|8)[\s\-()]*\d{3}[\s\-()]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)")
+_ADDRESS_LABEL = re.compile(r"(?:адрес(?:\s+проживания|\s+регистрации)?|проживает\s+по\s+адресу|прописка)\s*[:\-]?\s*([^\n]+)", re.IGNORECASE)
+_ADDRESS_HINT = re.compile(r"(?:\bг\.|\bгород\b|\bул\.|\bулица\b|\bмкр\.?|\bпр\.|\bпроспект\b|\bд\.|\bдом\b|\bкв\.)", re.IGNORECASE)
+# «г.» и «д.», которые не относятся к адресу: «1990 г.р.», «д.р. 01.02.1990», «от 2021 г.»
+_NOT_ADDRESS = re.compile(r"\b[гд]\.\s*р\.?|\d\s*г\.", re.IGNORECASE)
+
+
+def _title(word: str) -> str:
+    return "-".join(part[:1].upper() + part[1:].lower() for part in word.split("-"))
+
+
+def find_full_name(text: str):
+    """ФИО с отчеством (или «улы/кызы») из текста, приведённое к виду «Иванов Иван Иванович»."""
+    match = _FULL_NAME.search(text)
+    if not match:
+        return None
+    patronymic = re.sub(r"[ \t]+", " ", match.group(3))
+    return " ".join((_title(match.group(1)), _title(match.group(2)), " ".join(_title(w) for w in patronymic.split(" "))))
+
+
+def short_name(full_name: str) -> str:
+    """«Иванов Иван Иванович» -> «Иванов И.И.»"""
+    parts = full_name.split()
+    initials = "".join(f"{part[0]}." for part in parts[1:3])
+    return f"{parts[0]} {initials}"
+
+
+def is_male(full_name: str):
+    """Пол по окончанию отчества; None, если определить нельзя."""
+    last = full_name.split()[-1].lower()
+    if last.endswith(_FEMALE_SUFFIXES):
+        return False
+    if last.endswith(_MALE_SUFFIXES):
+        return True
+    return None
+
+
+def find_address(text: str):
+    match = _ADDRESS_LABEL.search(text)
+    if match:
+        return match.group(1).strip(" ,;")
+    # Без подписи «Адрес» — первая строка, похожая на адрес. Строки с ФИО, e-mail
+    # и телефоном пропускаем; если такой строки нет, адрес спросим у модели
+    for line in text.splitlines():
+        if _FULL_NAME.search(line) or _EMAIL.search(line) or _PHONE.search(line):
+            continue
+        if _ADDRESS_HINT.search(_NOT_ADDRESS.sub(" ", line)):
+            return line.strip(" ,;")
+    return None
+
+
+def extract_client_data(first_page: str, caption: str):
+    """Данные клиента из подписи к PDF и первой страницы ПКО без обращения к LLM.
+
+    С первой страницы берётся только ФИО; e-mail, телефон и адрес — из подписи.
+
+    Возвращает (данные, недостающие поля): в данных только то, что удалось
+    определить; недостающие поля нужно спросить у модели.
+    """
+    data = {}
+
+    full_name = find_full_name(caption) or find_full_name(first_page)
+    if full_name:
+        data["fullName"] = full_name
+        data["shortName"] = short_name(full_name)
+        male = is_male(full_name)
+        if male is not None:
+            data["isMale"] = male
+
+    # Контакты — только из подписи: на первой странице ПКО бывают телефон
+    # и почта самого кредитного бюро, а не клиента
+    if match := _EMAIL.search(caption):
+        data["email"] = match.group(0)
+    if match := _PHONE.search(caption):
+        data["phone"] = re.sub(r"\s+", " ", match.group(0)).strip()
+
+    address = find_address(caption)
+    if address:
+        data["address"] = address
+
+    missing = [field for field in CLIENT_FIELDS if field not in data]
+    return data, missing
+
+
+class ClientData(BaseModel):
+    """Данные клиента для письма; проверка каждого поля, пришедшего от модели."""
+
+    fullName: Optional[str] = None
+    shortName: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    isMale: Optional[bool] = None
+
+    @field_validator("fullName", "shortName", "address")
+    @classmethod
+    def not_blank(cls, value):
+        if value is not None and not value.strip():
+            raise ValueError("пустое значение")
+        return value.strip() if value is not None else None
+
+    @field_validator("fullName")
+    @classmethod
+    def has_surname_and_name(cls, value):
+        if value is not None and len(value.split()) < 2:
+            raise ValueError("нужны хотя бы фамилия и имя")
+        return value
+
+    @field_validator("email")
+    @classmethod
+    def valid_email(cls, value):
+        if value is not None and not _EMAIL.fullmatch(value.strip()):
+            raise ValueError("некорректный e-mail")
+        return value.strip() if value is not None else None
+
+    @field_validator("phone")
+    @classmethod
+    def valid_phone(cls, value):
+        if value is not None and len(re.sub(r"\D", "", value)) < 10:
+            raise ValueError("в номере меньше 10 цифр")
+        return value.strip() if value is not None else None
+
+
+# JSON-схема ответа модели: только запрошенные поля, null — «не найдено»
+_FIELD_TYPES = {"isMale": "boolean"}
+
+
+def client_json_schema(fields) -> dict:
+    return {
+        "type": "object",
+        "properties": {field: {"type": [_FIELD_TYPES.get(field, "string"), "null"]} for field in fields},
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+
+
+def validate_client_fields(raw: dict, fields):
+    """Разбирает ответ модели по ClientData: (прошедшие проверку поля, пустые или неверные)."""
+    valid, invalid = {}, []
+    for field in fields:
+        value = raw.get(field) if isinstance(raw, dict) else None
+        if value is None or value == "":
+            invalid.append(field)
+            continue
+        try:
+            valid[field] = getattr(ClientData.model_validate({field: value}), field)
+        except ValidationError:
+            invalid.append(field)
+    return valid, invalid
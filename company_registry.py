@@ -0,0 +1,153 @@
+import json
+import os
+import re
+from collections import Counter
+
+# Порог уверенности для автоматической подстановки похожего названия;
+# ниже порога замену подтверждает оператор (.env)
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.8"))
+# Насколько лучший вариант должен опережать любой следующий
+FUZZY_MARGIN = 0.15
+# Подсказки с оценкой ниже этой не показываются: название считается не найденным (.env)
+FUZZY_SUGGEST_MIN = float(os.getenv("FUZZY_SUGGEST_MIN", "0.4"))
+
+# Латинские буквы, которые в базе и во вводе встречаются вместо похожих кириллических
+_HOMOGLYPHS = str.maketrans("aceopxykmtbhё", "асеорхукмтвне")
+_NOT_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_string(s):
+    return re.sub(r'\s+', '', s).lower()  # удаляет ВСЕ пробельные символы и приводит к нижнему регистру
+
+
+def fold_name(s):
+    """Ключ для нечёткого поиска: без пробелов и знаков, латинские двойники заменены кириллицей."""
+    return _NOT_WORD.sub('', s.lower()).translate(_HOMOGLYPHS)
+
+
+def trigrams(s):
+    padded = f"  {s} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyRegistry:
+    """База МФО из companies_db.json, загруженная в память и проиндексированная.
+
+    Индексы по trade_name и search_field строятся один раз на загрузку. Файл
+    перечитывается, только если изменился его mtime; новое состояние подменяется
+    целиком, так что читатели никогда не видят наполовину обновлённую базу.
+    """
+
+    def __init__(self, path: str = "companies_db.json"):
+        self.path = path
+        self._mtime = None
+        self._companies = []
+        self._by_trade_name = {}
+        self._by_search_field = {}
+        self._fuzzy = ([], {})
+        self.version = 0  # растёт при каждой перезагрузке
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            print("Файл companies_db.json не найден.")
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                companies = json.load(file)
+        except json.JSONDecodeError:
+            # Файл могут как раз редактировать — остаёмся на прежней версии
+            # до следующего изменения файла
+            print("Ошибка при разборе JSON.")
+            self._mtime = mtime
+            return
+
+        by_trade_name = {}
+        by_search_field = {}
+        for company in companies:
+            by_trade_name.setdefault(normalize_string(company["trade_name"]), company)
+            by_search_field.setdefault(normalize_string(company["search_field"]), []).append(company)
+
+        # Триграммный индекс: триграмма -> номера записей в fuzzy_entries
+        fuzzy_entries = []
+        fuzzy_index = {}
+        for company in companies:
+            grams = trigrams(fold_name(company["trade_name"]))
+            for gram in grams:
+                fuzzy_index.setdefault(gram, []).append(len(fuzzy_entries))
+            fuzzy_entries.append((len(grams), company))
+
+        self._companies, self._by_trade_name, self._by_search_field, self._fuzzy = (
+            companies, by_trade_name, by_search_field, (fuzzy_entries, fuzzy_index))
+        self._mtime = mtime
+        self.version += 1
+
+    @property
+    def companies(self):
+        self._load()
+        return self._companies
+
+    @property
+    def search_fields(self):
+        """Все значения search_field без повторов, в порядке базы."""
+        return list(dict.fromkeys(company["search_field"] for company in self.companies))
+
+    def by_trade_name(self, trade_name):
+        """Компания по торговому названию (без учёта пробелов и регистра) или None."""
+        self._load()
+        return self._by_trade_name.get(normalize_string(trade_name))
+
+    def by_search_field(self, search_field):
+        """Все компании с этим search_field (у одного юрлица бывает несколько брендов)."""
+        self._load()
+        return self._by_search_field.get(normalize_string(search_field), [])
+
+    def suggest(self, name, k=3):
+        """До k похожих компаний: список пар (оценка 0..1, компания), лучшие первыми.
+
+        Оценка — коэффициент Дайса по триграммам названий после fold_name.
+        """
+        self._load()
+        entries, index = self._fuzzy
+        grams = trigrams(fold_name(name))
+        shared = Counter()
+        for gram in grams:
+            for entry in index.get(gram, ()):
+                shared[entry] += 1
+
+        scored = {}
+        for entry, count in shared.items():
+            size, company = entries[entry]
+            score = 2 * count / (size + len(grams))
+            # Один бренд может встречаться в базе несколько раз — оставляем лучший
+            key = company["trade_name"]
+            if score > scored.get(key, (0, None))[0]:
+                scored[key] = (score, company)
+        return sorted(scored.values(), key=lambda item: item[0], reverse=True)[:k]
+
+    def resolve(self, name, threshold=FUZZY_THRESHOLD, k=3):
+        """Компания по торговому названию с поправкой на опечатки и латинские двойники.
+
+        Возвращает (компания или None, подсказки). Похожее название подставляется
+        автоматически, только если его оценка не ниже threshold и на FUZZY_MARGIN
+        выше любой другой подсказки; иначе компания — None, а подсказки — до k
+        вариантов с оценкой не ниже FUZZY_SUGGEST_MIN (их предлагают оператору
+        на выбор; пустой список — похожего названия в базе нет).
+        """
+        company = self.by_trade_name(name)
+        if company is not None:
+            return company, []
+
+        suggestions = self.suggest(name, k)
+        if suggestions and suggestions[0][0] >= threshold:
+            best_score, best = suggestions[0]
+            if len(suggestions) == 1 or best_score - suggestions[1][0] >= FUZZY_MARGIN:
+                return best, suggestions
+        return None, [item for item in suggestions if item[0] >= FUZZY_SUGGEST_MIN]
+
+
+registry = CompanyRegistry()
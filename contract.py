@@ -0,0 +1,68 @@
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from num2words import num2words
+
+_AMOUNT_JUNK = re.compile(r'[^\d.,-]')
+
+
+def parse_amount(value) -> Decimal:
+    """Сумма из ПКО («150 000,00 KZT», «108000.00KZT») в Decimal; нечисловое — 0."""
+    if not value:
+        return Decimal(0)
+    cleaned = _AMOUNT_JUNK.sub('', value).replace(',', '.')
+    try:
+        return Decimal(cleaned)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def parse_date(value):
+    """Дата «дд.мм.гггг» в date или None."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def amount_in_words(value: int) -> str:
+    # num2words медленный, а суммы в пачке часто повторяются
+    return num2words(value, lang='ru')
+
+
+def format_amount(value: Decimal) -> str:
+    """Сумма без копеек с пробелами между разрядами: 150 000."""
+    return f"{int(value):,}".replace(",", " ")
+
+
+class Contract:
+    """Действующий договор из ПКО: суммы и даты разобраны один раз при извлечении."""
+
+    __slots__ = ("number", "start_date", "end_date", "total_amount", "overdue_amount",
+                 "outstanding_amount", "iin")
+
+    def __init__(self, number=None, start_date=None, end_date=None, total_amount=Decimal(0),
+                 overdue_amount=Decimal(0), outstanding_amount=Decimal(0), iin=None):
+        self.number = number
+        self.start_date = start_date
+        self.end_date = end_date
+        self.total_amount = total_amount
+        self.overdue_amount = overdue_amount
+        self.outstanding_amount = outstanding_amount
+        self.iin = iin
+
+    def __eq__(self, other):
+        return isinstance(other, Contract) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Contract(number={self.number!r}, iin={self.iin!r}, outstanding_amount={self.outstanding_amount})"
+
+    @property
+    def claim_amount(self) -> Decimal:
+        """Сумма требования: непогашенная сумма или просрочка — что больше."""
+        return self.outstanding_amount if self.outstanding_amount >= self.overdue_amount else self.overdue_amount
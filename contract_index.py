@@ -0,0 +1,49 @@
+class ContractIndex:
+    """Действующие договоры отчёта, разобранные один раз и проиндексированные по кредитору.
+
+    contracts — список пар (нормализованный текст блока, Contract)
+    в порядке следования в отчёте. normalize — функция нормализации названия компании,
+    та же, что использовалась для текста блоков. matcher — CreditorMatcher по известным
+    кредиторам: каждый блок сканируется им один раз. keys — ключи этого автомата:
+    по ним видно, для какой версии базы построен индекс.
+    """
+
+    def __init__(self, contracts, normalize, matcher=None):
+        self.contracts = contracts
+        self.normalize = normalize
+        self.keys = tuple(matcher.keys) if matcher is not None else ()
+        self._by_name = {}
+        # Для каждого договора — множество известных кредиторов, найденных в его тексте
+        self.creditors = []
+        if matcher is not None:
+            for key in matcher.keys:
+                self._by_name[key] = None
+            for text, contract in contracts:
+                keys = matcher.find_all(text)
+                self.creditors.append(keys)
+                for key in keys:
+                    # Первый договор в отчёте, где встречается название (как и раньше)
+                    if self._by_name[key] is None:
+                        self._by_name[key] = contract
+
+    def _scan(self, key):
+        for text, contract in self.contracts:
+            if key in text:
+                return contract
+        return None
+
+    def with_creditors(self):
+        """Пары (договор, найденные в нём ключи кредиторов) в порядке отчёта."""
+        for (_, contract), keys in zip(self.contracts, self.creditors):
+            yield contract, keys
+
+    def __len__(self):
+        return len(self.contracts)
+
+    def find(self, company_name):
+        """Договор для компании по её search_field или None."""
+        key = self.normalize(company_name)
+        if key not in self._by_name:
+            # Название не из базы — один проход по договорам, результат запоминаем
+            self._by_name[key] = self._scan(key)
+        return self._by_name[key]
@@ -0,0 +1,76 @@
+from collections import deque
+from company_registry import registry
+
+
+class CreditorMatcher:
+    """Автомат Ахо — Корасик по нормализованным названиям кредиторов.
+
+    Один линейный проход по нормализованному тексту договора находит
+    все известные названия, которые в нём встречаются.
+    """
+
+    def __init__(self, names, normalize):
+        self.normalize = normalize
+        self.keys = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for name in names:
+            key = normalize(name)
+            if key and key not in self.keys:
+                self.keys.append(key)
+                self._add(key)
+        self._link()
+
+    def _add(self, key):
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (key,)
+
+    def _link(self):
+        # Суффиксные ссылки в порядке BFS; выходы наследуются по ссылкам
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str):
+        """Множество ключей (нормализованных названий), найденных в уже нормализованном тексте."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+_matchers = {}
+
+
+def creditor_matcher(normalize) -> CreditorMatcher:
+    """Автомат по всем search_field из базы; перестраивается, только если база перезагрузилась."""
+    registry.companies  # подхватывает изменения файла
+    cached = _matchers.get(normalize)
+    if cached is None or cached[0] != registry.version:
+        cached = (registry.version, CreditorMatcher(registry.search_fields, normalize))
+        _matchers[normalize] = cached
+    return cached[1]
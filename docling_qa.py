@@ -1,6 +1,10 @@
 import os
 from typing import List
-import fitz  # PyMuPDF
+import numpy as np
+from pko_document import as_pko_document
+from embedding_cache import embedding_cache
+from retrieval import normalize_rows, top_k
+from llm_scheduler import estimate_tokens, llm_scheduler
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -8,48 +12,36 @@ load_dotenv()
 client = OpenAI()
 
 # Чтение текста из PDF с ограничением по страницам
-def extract_text_from_pdf(pdf_path: str, max_pages: int = None) -> List[str]:
-    doc = fitz.open(pdf_path)
-    chunks = []
-    for i, page in enumerate(doc):
-        if max_pages is not None and i >= max_pages:
-            break
-        text = page.get_text().strip()
-        if text:
-            chunks.append(text)
-    return chunks
-
-# Получение эмбеддингов из OpenAI
-def embed_chunks(chunks: List[str]) -> List[List[float]]:
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
+def extract_text_from_pdf(pko, max_pages: int = None) -> List[str]:
+    pages = as_pko_document(pko).pages[:max_pages]
+    return [text.strip() for text in pages if text.strip()]
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+# Запрос эмбеддингов в OpenAI
+def request_embeddings(chunks: List[str]) -> List[List[float]]:
+    response = llm_scheduler.run_blocking(estimate_tokens(*chunks), lambda: client.embeddings.create(
+        model=EMBEDDING_MODEL,
         input=chunks
-    )
+    ))
     return [e.embedding for e in response.data]
 
+# Получение эмбеддингов: из локального кеша, в API — только новые тексты
+# Строки нормированы — косинус считается одним скалярным произведением
+def embed_chunks(chunks: List[str]) -> np.ndarray:
+    return normalize_rows(embedding_cache.embed(EMBEDDING_MODEL, chunks, request_embeddings))
+
 # Получение эмбеддинга для запроса
-def embed_query(query: str) -> List[float]:
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=[query]
-    )
-    return response.data[0].embedding
-
-# Косинусное сходство
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    import numpy as np
-    a, b = np.array(a), np.array(b)
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-
-# Получение релевантного контекста
-def get_top_k_context(chunks: List[str], vectors: List[List[float]], query_embedding: List[float], k=5) -> str:
-    scored = [(text, cosine_similarity(vec, query_embedding)) for text, vec in zip(chunks, vectors)]
-    top = sorted(scored, key=lambda x: x[1], reverse=True)[:k]
-    return "\n\n".join([text for text, _ in top])
+def embed_query(query: str) -> np.ndarray:
+    return embed_chunks([query])[0]
+
+# Получение релевантного контекста: vectors — нормированная матрица из embed_chunks
+def get_top_k_context(chunks: List[str], vectors: np.ndarray, query_embedding, k=5) -> str:
+    return "\n\n".join(chunks[i] for i in top_k(vectors, query_embedding, k))
 
 # Главная функция с параметром max_pages
-def ask_ai_from_pdf(pdf_path: str, question: str, max_pages: int = None) -> str:
-    chunks = extract_text_from_pdf(pdf_path, max_pages=max_pages)
+def ask_ai_from_pdf(pko, question: str, max_pages: int = None) -> str:
+    chunks = extract_text_from_pdf(pko, max_pages=max_pages)
     chunk_vectors = embed_chunks(chunks)
     query_vector = embed_query(question)
     context = get_top_k_context(chunks, chunk_vectors, query_vector)
@@ -68,11 +60,12 @@ doesn't contain the relevant information, say so
         {"role": "user", "content": question}
     ]
 
-    response = client.chat.completions.create(
+    tokens = estimate_tokens(system_prompt, question) + 300
+    response = llm_scheduler.run_blocking(tokens, lambda: client.chat.completions.create(
         model="gpt-4o-mini",
         messages=messages,
         temperature=0.7
-    )
+    ))
 
     return response.choices[0].message.content.strip()
 
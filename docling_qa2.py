@@ -1,92 +1,203 @@
+import asyncio
+import json
 import os
 from typing import List
-import fitz  # PyMuPDF
-from openai import OpenAI
+import httpx
+import numpy as np
+from pko_document import as_pko_document
+from embedding_cache import embedding_cache
+from retrieval import normalize_rows, top_k
+from page_ranker import select_pages
+from client_extractor import client_json_schema, validate_client_fields
+from llm_scheduler import current_user, estimate_tokens, llm_scheduler
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 client = OpenAI()
 
-# Чтение текста из PDF
-def extract_text_from_pdf(pdf_path: str) -> List[str]:
-    doc = fitz.open(pdf_path)
-    chunks = []
-    for page in doc:
-        text = page.get_text().strip()
-        if text:
-            chunks.append(text)
-    return chunks
-
-# Получение эмбеддингов из OpenAI
-def embed_chunks(chunks: List[str]) -> List[List[float]]:
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
+# Ограничения для асинхронного клиента (.env)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+ASK_AI_TIMEOUT = float(os.getenv("ASK_AI_TIMEOUT", "90"))
+# Сколько раз переспрашивать модель о пустых или неверных полях
+CLIENT_RETRIES = int(os.getenv("CLIENT_RETRIES", "1"))
+
+_async_client = None
+
+
+def async_client() -> AsyncOpenAI:
+    """AsyncOpenAI с общим пулом HTTP-соединений; создаётся при первом вызове."""
+    global _async_client
+    if _async_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+        )
+        # Повторы на 429, 5xx, таймаут и обрыв соединения делает llm_scheduler, а не SDK
+        _async_client = AsyncOpenAI(http_client=http_client, timeout=OPENAI_TIMEOUT, max_retries=0)
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+# Чтение текста из PDF (путь или уже открытый PkoDocument)
+def extract_text_from_pdf(pko) -> List[str]:
+    pages = as_pko_document(pko).pages
+    return [text.strip() for text in pages if text.strip()]
+
+# Страницы, которые стоит эмбеддить: с данными клиента, а не таблицы договоров
+def extract_client_pages(pko, question: str) -> List[str]:
+    return select_pages(extract_text_from_pdf(pko), question)
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+CHAT_MODEL = "gpt-4o-mini"
+
+# Запрос эмбеддингов в OpenAI
+def request_embeddings(chunks: List[str]) -> List[List[float]]:
+    response = llm_scheduler.run_blocking(estimate_tokens(*chunks), lambda: client.embeddings.create(
+        model=EMBEDDING_MODEL,
         input=chunks
-    )
+    ))
     return [e.embedding for e in response.data]
 
-# Получение эмбеддинга для запроса
-def embed_query(query: str) -> List[float]:
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=[query]
-    )
-    return response.data[0].embedding
-
-# Косинусное сходство
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    import numpy as np
-    a, b = np.array(a), np.array(b)
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-
-# Получение релевантного контекста
-def get_top_k_context(chunks: List[str], vectors: List[List[float]], query_embedding: List[float], k=5) -> str:
-    scored = [(text, cosine_similarity(vec, query_embedding)) for text, vec in zip(chunks, vectors)]
-    top = sorted(scored, key=lambda x: x[1], reverse=True)[:k]
-    return "\n\n".join([text for text, _ in top])
 
-# Главная функция
-def ask_ai_from_pdf2(pdf_path: str, question: str) -> str:
-    chunks = extract_text_from_pdf(pdf_path)
-    chunk_vectors = embed_chunks(chunks)
-    query_vector = embed_query(question)
-    context = get_top_k_context(chunks, chunk_vectors, query_vector)
+async def request_embeddings_async(chunks: List[str]) -> List[List[float]]:
+    response = await llm_scheduler.run(estimate_tokens(*chunks), lambda: async_client().embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=chunks
+    ))
+    return [e.embedding for e in response.data]
 
+# Получение эмбеддингов: из локального кеша, в API — только новые тексты
+# Строки нормированы — косинус считается одним скалярным произведением
+def embed_chunks(chunks: List[str]) -> np.ndarray:
+    return normalize_rows(embedding_cache.embed(EMBEDDING_MODEL, chunks, request_embeddings))
+
+# Получение эмбеддинга для запроса
+def embed_query(query: str) -> np.ndarray:
+    return embed_chunks([query])[0]
+
+# Получение релевантного контекста: vectors — нормированная матрица из embed_chunks
+def get_top_k_context(chunks: List[str], vectors: np.ndarray, query_embedding, k=5) -> str:
+    return "\n\n".join(chunks[i] for i in top_k(vectors, query_embedding, k))
+
+# Пример значения для каждого поля — в промпт попадают только запрошенные поля
+FIELD_EXAMPLES = {
+    "fullName": '"Иванов Иван Иванович"',
+    "shortName": '"Иванов И.И."',
+    "email": '"test@mail.ru"',
+    "phone": '"7 777 7777"',
+    "address": '"Астана, ул.Аксенгир дом 13 кв 1"',
+    "isMale": 'true',
+}
+
+# Сообщения для модели: инструкция с контекстом и вопрос
+def build_messages(context: str, question: str, fields) -> list:
+    example = ",\n".join(f'    "{field}": {FIELD_EXAMPLES[field]}' for field in fields)
+    male_hint = ("В поле isMale укажи булево значение: True, если fullName — мужчина, и False, если женщина.\n"
+                 if "isMale" in fields else "")
     system_prompt = f"""You are a helpful assistant that answers questions based on the provided context.
 Use only the information from the context to answer questions. If you're unsure or the context
 doesn't contain the relevant information, say so.
 
-Твоя задача распределить данные в словаре python. На поля: fullName, shortName, email, phone, address, isMale. 
-В поле isMale укажи булево значение: True, если fullName — мужчина, и False, если женщина.
-Придерживайся строгой стуктуры и не добавляй от себя ничего
+Твоя задача распределить данные в словаре python. На поля: {", ".join(fields)}. 
+{male_hint}Придерживайся строгой стуктуры и не добавляй от себя ничего. Если значения нет в контексте — пиши null
 Пример: пиши так чтобы можно было распарcить в json в python не добваляй ```json ```
 {{
-    "fullName": "Иванов Иван Иванович",
-    "shortName": "Иванов И.И."
-    "email": "test@mail.ru",
-    "phone": "7 777 7777",
-    "address": "Астана, ул.Аксенгир дом 13 кв 1",
-    "isMale": "True"
+{example}
 }}
 
 Context:
 {context}
 """
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": question}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+# Токены запроса к чату для бюджета: промпт и запас на ответ
+def chat_tokens(messages) -> int:
+    return estimate_tokens(*(message["content"] for message in messages)) + 300
+
+# Главная функция
+def ask_ai_from_pdf2(pko, question: str, fields=None) -> str:
+    fields = list(fields or FIELD_EXAMPLES)
+    chunks = extract_client_pages(pko, question)
+    chunk_vectors = embed_chunks(chunks)
+    query_vector = embed_query(question)
+    context = get_top_k_context(chunks, chunk_vectors, query_vector)
+
+    messages = build_messages(context, question, fields)
+    response = llm_scheduler.run_blocking(chat_tokens(messages), lambda: client.chat.completions.create(
+        model=CHAT_MODEL,
         messages=messages,
-        temperature=0.7
-    )
+        temperature=0
+    ))
 
     return response.choices[0].message.content.strip()
 
 
+async def _complete_fields(context: str, question: str, fields) -> dict:
+    # Ответ строго по JSON-схеме запрошенных полей
+    messages = build_messages(context, question, fields)
+    response = await llm_scheduler.run(chat_tokens(messages), lambda: async_client().chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        temperature=0,
+        response_format={"type": "json_schema", "json_schema": {
+            "name": "client_data", "strict": True, "schema": client_json_schema(fields)}},
+    ))
+    try:
+        return json.loads(response.choices[0].message.content or "")
+    except json.JSONDecodeError:
+        return {}
+
+
+async def _ask_ai_from_pdf2_async(pko, question: str, fields) -> dict:
+    chunks = extract_client_pages(pko, question)
+    # Страницы и вопрос — одним запросом эмбеддингов (и одной проверкой кеша)
+    vectors = normalize_rows(await embedding_cache.aembed(
+        EMBEDDING_MODEL, chunks + [question], request_embeddings_async))
+    context = get_top_k_context(chunks, vectors[:-1], vectors[-1])
+
+    result, missing = validate_client_fields(await _complete_fields(context, question, fields), fields)
+    for _ in range(CLIENT_RETRIES):
+        if not missing:
+            break
+        # Переспрашиваем только пустые или неверные поля с тем же контекстом
+        valid, missing = validate_client_fields(await _complete_fields(context, question, missing), missing)
+        result.update(valid)
+    return result
+
+
+async def ask_ai_from_pdf2_async(pko, question: str, fields=None, user=None, key=None) -> dict:
+    """Асинхронный вариант ask_ai_from_pdf2 для обработчиков бота: не блокирует event loop.
+
+    Возвращает словарь только с полями, прошедшими проверку ClientData;
+    то, что модель не нашла и после повторного запроса, в нём отсутствует.
+    Весь вызов ограничен ASK_AI_TIMEOUT (asyncio.TimeoutError); при отмене
+    задачи обработчика незавершённые HTTP-запросы отменяются вместе с ней.
+    Запросы идут через llm_scheduler в очереди пользователя user; одновременные
+    вызовы с одинаковым key (например, хеш PDF и подписи) выполняются один раз.
+    """
+    fields = list(fields or FIELD_EXAMPLES)
+    if user is not None:
+        current_user.set(user)
+
+    def extract():
+        return asyncio.wait_for(_ask_ai_from_pdf2_async(pko, question, fields), ASK_AI_TIMEOUT)
+
+    if key is None:
+        return await extract()
+    return await llm_scheduler.coalesce((key, tuple(fields)), extract)
+
 
 
 # from typing import List
@@ -1,11 +1,262 @@
+import asyncio
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
 from docxtpl import DocxTemplate
+from jinja2 import Template
+from executors import run_cpu
 
+# splice — быстрая подстановка для шаблонов из одних {{ key }}, docxtpl — всегда через Jinja (.env)
+DOCX_RENDERER = os.getenv("DOCX_RENDERER", "splice")
+# Сколько писем рендерит один процесс пула за задачу (.env)
+RENDER_CHUNK = int(os.getenv("RENDER_CHUNK", "4"))
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """DocxTemplate, который разбирает шаблон один раз и рендерит много писем.
+
+    Обычный DocxTemplate на каждое письмо заново распаковывает DOCX, разбирает
+    XML, прогоняет patch_xml и компилирует Jinja. Здесь исходный XML всех частей
+    подготавливается один раз, скомпилированные шаблоны запоминаются, а каждый
+    render() заменяет части уже загруженного документа — как и у docxtpl, целиком.
+    """
+
+    def __init__(self, template_file):
+        super().__init__(template_file)
+        super().init_docx()
+        self._compiled = {}
+        # Исходные (ещё не отрендеренные) XML частей после patch_xml
+        self._body_src = self.patch_xml(self.get_xml())
+        self._headers_footers_src = {}
+        for uri in (self.HEADER_URI, self.FOOTER_URI):
+            parts = []
+            for rel_key, part in self.get_headers_footers(uri):
+                xml = self.get_part_xml(part)
+                parts.append((rel_key, self.get_headers_footers_encoding(xml), self.patch_xml(xml)))
+            self._headers_footers_src[uri] = parts
+        self._properties_src = {prop: getattr(self.docx.core_properties, prop)
+                                for prop in ("author", "comments", "identifier", "language", "subject", "title")}
+        self._footnotes_src = [
+            (part, self.patch_xml(part.blob.decode("utf-8") if isinstance(part.blob, bytes) else part.blob))
+            for part in self.docx.part.package.parts
+            if part.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+        ]
+
+    def init_docx(self, reload=True):
+        # Документ загружен в __init__ и переиспользуется: render() заменяет части целиком
+        self.is_rendered = False
+
+    def _template(self, src_xml, jinja_env):
+        key = (id(jinja_env), src_xml)
+        template = self._compiled.get(key)
+        if template is None:
+            template = jinja_env.from_string(src_xml) if jinja_env else Template(src_xml)
+            self._compiled[key] = template
+        return template
+
+    def render_xml_part(self, src_xml, part, context, jinja_env=None):
+        # То же, что у docxtpl, но Jinja-шаблон части компилируется один раз
+        src_xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", src_xml)
+        self.current_rendering_part = part
+        dst_xml = self._template(src_xml, jinja_env).render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_xml_part(self._body_src, self.docx._part, context, jinja_env)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        for rel_key, encoding, xml in self._headers_footers_src[uri]:
+            part = self.docx._part.rels[rel_key].target_part
+            yield rel_key, self.render_xml_part(xml, part, context, jinja_env).encode(encoding)
+
+    def render_properties(self, context, jinja_env=None):
+        for prop, initial in self._properties_src.items():
+            rendered = self._template(initial, jinja_env).render(context)
+            setattr(self.docx.core_properties, prop, rendered)
+
+    def render_footnotes(self, context, jinja_env=None):
+        for part, xml in self._footnotes_src:
+            part._blob = self.render_xml_part(xml, part, context, jinja_env).encode("utf-8")
+
+    def render_to(self, out, data):
+        self.render(data)
+        self.save(out)
+
+
+# Как в docxtpl.patch_xml: склеиваем фигурные скобки, разорванные тегами Word
+_SPLIT_BRACES = re.compile(r"(?<={)(<[^>]*>)+(?=[\{%\#])|(?<=[%\}\#])(<[^>]*>)+(?=\})")
+_PLACEHOLDER = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+_SIMPLE_KEY = re.compile(r"\s*([A-Za-z_]\w*)\s*")
+_JINJA = re.compile(r"\{[{%#]|[}%#]\}")
+# Символы, которые docxtpl (resolve_listing) превращает в разметку: перенос строки,
+# табуляция, новый абзац, разрыв страницы
+_LISTING = re.compile("[\n\t\a\f]")
+# Как в docxtpl.patch_xml: пробелы по краям подставленного значения Word не должен съедать
+_PRESERVE_SPACE = re.compile(r"<w:t>((?:(?!<w:t>).)*)(\{\{.*?\}\})", re.DOTALL)
+DOCUMENT_XML = "word/document.xml"
+
+
+class UnsupportedTemplate(ValueError):
+    """В шаблоне есть что-то кроме {{ key }} — нужен docxtpl."""
+
+
+def split_placeholders(xml: str):
+    """document.xml -> ([(текст, ключ), ...], хвост).
+
+    Плейсхолдер, разорванный Word на несколько run-ов, склеивается: теги внутри
+    {{ }} выбрасываются, как это делает docxtpl. Всё, кроме простого {{ key }}
+    (фильтры, {% %}, {{r }}, {{p }} и т.п.), — UnsupportedTemplate.
+    """
+    xml = _PRESERVE_SPACE.sub(r'<w:t xml:space="preserve">\1\2', _SPLIT_BRACES.sub("", xml))
+    segments = []
+    position = 0
+    for match in _PLACEHOLDER.finditer(xml):
+        key = _SIMPLE_KEY.fullmatch(_TAG.sub("", match.group(1)))
+        if key is None:
+            raise UnsupportedTemplate(match.group(0))
+        segments.append((xml[position:match.start()], key.group(1)))
+        position = match.end()
+    tail = xml[position:]
+    if any(_JINJA.search(text) for text, _ in segments) or _JINJA.search(tail):
+        raise UnsupportedTemplate("управляющие конструкции Jinja")
+    return segments, tail
+
+
+class SplicedTemplate:
+    """Быстрый рендер шаблона письма, где есть только подстановки {{ key }}.
+
+    document.xml один раз разбивается на куски текста и ключи; письмо — это
+    склейка кусков с экранированными значениями. Переносы строк и табуляции
+    в значениях превращаются в разметку Word так же, как в docxtpl. Остальные
+    части DOCX сжаты заранее в готовый ZIP, в который дописывается только document.xml.
+    """
+
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as template:
+            members = [(info, template.read(info)) for info in template.infolist()]
+        prebuilt = io.BytesIO()
+        with zipfile.ZipFile(prebuilt, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info, blob in members:
+                if info.filename == DOCUMENT_XML:
+                    self.segments, self.tail = split_placeholders(blob.decode("utf-8"))
+                    continue
+                # Колонтитулы, сноски, свойства документа тоже должны быть без Jinja
+                if info.filename.endswith(".xml") and _JINJA.search(blob.decode("utf-8", "ignore")):
+                    raise UnsupportedTemplate(info.filename)
+                archive.writestr(info, blob, zipfile.ZIP_DEFLATED)
+        self.prebuilt = prebuilt.getvalue()
+
+    def render_bytes(self, data) -> bytes:
+        parts = []
+        listings = []  # (начало, конец) значений с переносами строк и т.п.
+        position = 0
+        for text, key in self.segments:
+            parts.append(text)
+            position += len(text)
+            # Как в Jinja: отсутствующий ключ — пустая строка
+            value = data.get(key)
+            value = "" if value is None and key not in data else escape(str(value))
+            if _LISTING.search(value):
+                listings.append((position, position + len(value)))
+            parts.append(value)
+            position += len(value)
+        parts.append(self.tail)
+        document = "".join(parts)
+        # Многострочные значения (приложения списком, причина) — в <w:br/>, <w:tab/>
+        # и новые абзацы с теми же свойствами run-а тем же кодом, что у docxtpl,
+        # но только в абзацах с такими значениями, а не по всему документу
+        for start, end in reversed(listings):
+            start = max(document.rfind("<w:p>", 0, start), document.rfind("<w:p ", 0, start))
+            end = document.find("</w:p>", end) + len("</w:p>")
+            document = document[:start] + DocxTemplate.resolve_listing(self, document[start:end]) + document[end:]
+        document = document.encode("utf-8")
+
+        buffer = io.BytesIO(self.prebuilt)
+        buffer.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(DOCUMENT_XML, document)
+        return buffer.getvalue()
+
+    def render_to(self, out, data):
+        document = self.render_bytes(data)
+        if isinstance(out, (str, os.PathLike)):
+            with open(out, "wb") as file:
+                file.write(document)
+        else:
+            out.write(document)
+
+
+# Шаблоны по пути: (st_mtime_ns, шаблон); свои в каждом процессе пула
+_templates = {}
+
+
+def _build_template(path):
+    if DOCX_RENDERER == "splice":
+        try:
+            return SplicedTemplate(path)
+        except UnsupportedTemplate:
+            pass
+    return CachedDocxTemplate(path)
+
+
+def load_template(path):
+    """Разобранный шаблон (SplicedTemplate или CachedDocxTemplate); заново читается, только если файл изменился."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _templates.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, _build_template(path))
+        _templates[path] = cached
+    return cached[1]
+
+
+def render_doc(temp_path, data) -> bytes:
+    """Письмо по шаблону в памяти — для отправки без временного файла."""
+    buffer = io.BytesIO()
+    load_template(temp_path).render_to(buffer, data)
+    return buffer.getvalue()
 
 
 def fill_doc(temp_path, out_path, data):
-    # Загружаем шаблон с помощью docxtpl
-    doc = DocxTemplate(temp_path)
-    # Передаем данные для замены в шаблон
-    doc.render(data)
-    # Сохраняем результат
-    doc.save(out_path)
+    # Шаблон разбирается один раз (или при изменении файла); сохраняем письмо в out_path
+    load_template(temp_path).render_to(out_path, data)
+
+
+def render_docs(temp_path, shared, records):
+    """Точка входа для пула процессов: письма для records с общими полями shared."""
+    return [render_doc(temp_path, {**shared, **record}) for record in records]
+
+
+async def render_batch(temp_path, shared, records, chunk_size=RENDER_CHUNK):
+    """Рендерит письма пачки в пуле процессов и отдаёт (индекс в records, bytes) по мере готовности.
+
+    Пока отправляются готовые письма, остальные ещё рендерятся. Если потребитель
+    прервал обход (обходить через contextlib.aclosing), незавершённые задачи
+    отменяются, а ошибки завершённых забираются, чтобы не попасть в лог asyncio.
+    """
+    tasks = {}
+    for start in range(0, len(records), chunk_size):
+        task = asyncio.ensure_future(run_cpu(render_docs, temp_path, shared, records[start:start + chunk_size]))
+        tasks[task] = start
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for offset, document in enumerate(task.result()):
+                    yield tasks[task] + offset, document
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
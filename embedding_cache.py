@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import os
+import pickle
+import threading
+import numpy as np
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """Эмбеддинги одной модели на диске.
+
+    Векторы лежат float32-матрицей в memmap-файле vectors.f32, индекс
+    (sha1 текста -> [слот, отметка использования]) — в index.pkl. Когда
+    слотов на max_bytes уже не хватает, перезаписываются давно не
+    использованные.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.pkl")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.dim = None
+        self.slots = {}
+        self.free = []
+        self.capacity = 0
+        self.tick = 0
+        self.vectors = None
+
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as file:
+                state = pickle.load(file)
+            dim = state["dim"]
+            capacity = os.path.getsize(self.vectors_path) // (dim * 4)
+        except FileNotFoundError:
+            return
+        except (pickle.UnpicklingError, EOFError, KeyError, TypeError, ZeroDivisionError):
+            # Повреждённый индекс — начинаем с пустого кеша
+            return
+        if any(slot >= capacity for slot, _ in state["slots"].values()):
+            return
+        self.dim, self.slots, self.tick, self.capacity = dim, state["slots"], state["tick"], capacity
+        if capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        used = {slot for slot, _ in self.slots.values()}
+        self.free = [slot for slot in range(capacity) if slot not in used]
+
+    def _save(self):
+        self.vectors.flush()
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump({"dim": self.dim, "slots": self.slots, "tick": self.tick}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def max_slots(self) -> int:
+        return max(1, self.max_bytes // (self.dim * 4))
+
+    def _grow(self, needed: int):
+        capacity = min(self.max_slots, max(needed, self.capacity * 2, 64))
+        if capacity <= self.capacity:
+            return
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.vectors_path, "ab") as file:
+            file.truncate(capacity * self.dim * 4)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.free.extend(range(self.capacity, capacity))
+        self.capacity = capacity
+
+    def _allocate(self, count: int):
+        if len(self.free) < count:
+            self._grow(self.capacity + count - len(self.free))
+        if len(self.free) < count:
+            # Места нет — освобождаем давно не использованные слоты
+            oldest = sorted(self.slots.items(), key=lambda item: item[1][1])[:count - len(self.free)]
+            for key, (slot, _) in oldest:
+                del self.slots[key]
+                self.free.append(slot)
+        slots, self.free = self.free[:count], self.free[count:]
+        return slots
+
+    def lookup(self, keys):
+        """Векторы для найденных ключей: {ключ: копия вектора}."""
+        found = {}
+        for key in keys:
+            entry = self.slots.get(key)
+            if entry is not None:
+                self.tick += 1
+                entry[1] = self.tick
+                found[key] = np.array(self.vectors[entry[0]])
+        return found
+
+    def store(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if vectors.shape[1] != self.dim:
+            return
+        # Ключи, которые параллельно уже сохранил другой поток, пропускаем;
+        # пачка больше всего кеша — сохраняем сколько влезет
+        new = [i for i, key in enumerate(keys) if key not in self.slots][:self.max_slots]
+        keys, vectors = [keys[i] for i in new], vectors[new]
+        for key, slot, vector in zip(keys, self._allocate(len(keys)), vectors):
+            self.vectors[slot] = vector
+            self.tick += 1
+            self.slots[key] = [slot, self.tick]
+        self._save()
+
+
+class EmbeddingCache:
+    """Кеш эмбеддингов по (модель, sha1 текста): в API уходят только промахи.
+
+    Повторные ПКО и одинаковые служебные страницы/вопросы не стоят запросов.
+    Ограничение max_bytes действует на каждую модель отдельно.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _store(self, model: str) -> EmbeddingStore:
+        store = self._stores.get(model)
+        if store is None:
+            store = EmbeddingStore(os.path.join(self.directory, model.replace("/", "_")), self.max_bytes)
+            self._stores[model] = store
+        return store
+
+    def _lookup(self, model: str, texts):
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            store = self._store(model)
+            found = store.lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        return store, keys, found, missing
+
+    def _remember(self, store, found, missing, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        found.update(zip(missing, vectors))
+        with self._lock:
+            store.store(list(missing), vectors)
+
+    @staticmethod
+    def _matrix(store, keys, found) -> np.ndarray:
+        if not keys:
+            return np.zeros((0, store.dim or 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def embed(self, model: str, texts, fetch) -> np.ndarray:
+        """Матрица эмбеддингов для texts; fetch(список текстов) вызывается только для промахов."""
+        store, keys, found, missing = self._lookup(model, texts)
+        if missing:
+            # Запрос к API — без блокировки, чтобы не задерживать другие потоки
+            self._remember(store, found, missing, fetch(list(missing.values())))
+        return self._matrix(store, keys, found)
+
+    async def aembed(self, model: str, texts, fetch) -> np.ndarray:
+        """То же для асинхронного fetch; запись на диск — в потоке, не в event loop."""
+        store, keys, found, missing = self._lookup(model, texts)
+        if missing:
+            vectors = await fetch(list(missing.values()))
+            await asyncio.to_thread(self._remember, store, found, missing, vectors)
+        return self._matrix(store, keys, found)
+
+embedding_cache = EmbeddingCache(
+    directory=os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings"),
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "200")) * 1024 * 1024,
+)
@@ -0,0 +1,54 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# Размеры пулов задаются через окружение (.env)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+
+_process_pool = None
+_thread_pool = None
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """Пул процессов для CPU-задач: разбор PDF, рендер DOCX."""
+    global _process_pool
+    if _process_pool is None:
+        # Не fork: к первому run_cpu в процессе бота уже работают потоки (пул
+        # ввода-вывода, aiohttp), а fork процесса с потоками может повесить
+        # дочерний процесс на унаследованной блокировке
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+
+def thread_pool() -> ThreadPoolExecutor:
+    """Пул потоков для блокирующего ввода-вывода: синхронные запросы к OpenAI, файлы."""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _thread_pool
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Выполняет func в пуле процессов, не блокируя event loop (аргументы должны пиклиться)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool(), partial(func, *args, **kwargs))
+
+
+async def run_io(func, *args, **kwargs):
+    """Выполняет блокирующую func в пуле потоков, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(thread_pool(), partial(func, *args, **kwargs))
+
+
+def shutdown():
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(cancel_futures=True)
+        _thread_pool = None
@@ -9,3 +9,22 @@ select_file_version = ReplyKeyboardMarkup(keyboard=[
                     
 )
 
+
+ALL_CREDITORS = "Все известные МФО"
+
+all_creditors = ReplyKeyboardMarkup(keyboard=[
+    [KeyboardButton(text=ALL_CREDITORS)]
+],                  resize_keyboard=True,
+)
+
+
+SKIP_MFO = "⏭ Пропустить"
+
+
+def mfo_candidates(trade_names):
+    """Кнопки с похожими МФО из базы (по одной в ряд) и «Пропустить»."""
+    return ReplyKeyboardMarkup(keyboard=[
+        *([KeyboardButton(text=trade_name)] for trade_name in trade_names),
+        [KeyboardButton(text=SKIP_MFO)]
+    ],                  resize_keyboard=True,
+    )
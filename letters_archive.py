@@ -0,0 +1,60 @@
+import csv
+import io
+import os
+import zipfile
+
+# Пачка больше этого числа писем отправляется одним ZIP (.env)
+LETTERS_ZIP_THRESHOLD = int(os.getenv("LETTERS_ZIP_THRESHOLD", "10"))
+
+MANIFEST_NAME = "реестр договоров.csv"
+MANIFEST_HEADER = ["Файл", "МФО", "Номер договора", "Дата начала", "Общая сумма кредита",
+                   "Сумма требования", "ИИН"]
+
+
+class LettersArchive:
+    """ZIP с письмами пачки и CSV-реестром договоров — одна отправка вместо N.
+
+    Письма дописываются в архив по мере рендера (DOCX уже сжат, поэтому
+    хранится без повторного сжатия); реестр — в порядке писем пачки.
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._zip = zipfile.ZipFile(self._buffer, "w")
+        self._names = set()
+        self._rows = []
+
+    def _unique(self, filename: str) -> str:
+        name, ext = os.path.splitext(filename)
+        candidate, n = filename, 2
+        while candidate in self._names:
+            candidate = f"{name} ({n}){ext}"
+            n += 1
+        self._names.add(candidate)
+        return candidate
+
+    def add(self, index: int, filename: str, document: bytes, mfo_name: str, contract):
+        filename = self._unique(filename)
+        self._zip.writestr(filename, document, zipfile.ZIP_STORED)
+        self._rows.append((index, [
+            filename,
+            mfo_name,
+            contract.number,
+            contract.start_date.strftime("%d.%m.%Y") if contract.start_date else "",
+            str(contract.total_amount),
+            str(contract.claim_amount),
+            contract.iin or "",
+        ]))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def getvalue(self) -> bytes:
+        """Дописывает реестр (utf-8 с BOM и «;» — открывается в Excel) и возвращает ZIP."""
+        manifest = io.StringIO()
+        writer = csv.writer(manifest, delimiter=";")
+        writer.writerow(MANIFEST_HEADER)
+        writer.writerows(row for _, row in sorted(self._rows, key=lambda item: item[0]))
+        self._zip.writestr(MANIFEST_NAME, manifest.getvalue().encode("utf-8-sig"), zipfile.ZIP_DEFLATED)
+        self._zip.close()
+        return self._buffer.getvalue()
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import statistics
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+# Бюджеты OpenAI на процесс (.env)
+LLM_RPM = int(os.getenv("LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("LLM_TPM", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+WINDOW = 60.0
+
+# Пользователь, от имени которого идут запросы (для справедливой очереди)
+current_user: ContextVar = ContextVar("llm_user", default=None)
+
+
+def estimate_tokens(*texts) -> int:
+    """Грубая оценка токенов: около 4 символов на токен."""
+    return max(1, sum(len(text) for text in texts) // 4)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _retry_after(error: Exception, attempt: int) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        # Заголовка нет — экспоненциальная пауза 1, 2, 4… с, не больше минуты
+        return min(WINDOW, 2.0 ** attempt)
+
+
+class LlmScheduler:
+    """Общая очередь запросов к OpenAI на весь процесс.
+
+    Запрос выполняется, когда есть свободный слот (max_concurrency) и бюджет
+    в скользящем окне минуты (rpm запросов, tpm токенов). Ожидающие
+    обслуживаются по кругу по пользователям, чтобы большая пачка одного
+    оператора не задерживала остальных. На 429 вся очередь встаёт на паузу
+    по Retry-After, запрос повторяется; на 5xx, таймаут и обрыв соединения
+    повторяется только сам запрос после такой же паузы. Одинаковые одновременные задачи
+    (coalesce) выполняются один раз.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int, max_retries: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._queues = {}
+        self._users = deque()
+        self._window = deque()  # (время выдачи, токены)
+        self._window_tokens = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer = None
+        self._coalesced = {}
+        self._loop = None
+        self._waits = deque(maxlen=1000)
+        self.counters = {"requests": 0, "rate_limited": 0, "server_errors": 0, "coalesced": 0}
+
+    # --- выдача слотов ---------------------------------------------------
+
+    def _trim_window(self, now):
+        while self._window and now - self._window[0][0] >= WINDOW:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _budget_delay(self, tokens, now) -> float:
+        """Через сколько секунд запрос на tokens уложится в бюджет (0 — сейчас)."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if not self._window:
+            return 0.0  # даже запрос больше tpm пропускаем в пустое окно
+        if len(self._window) < self.rpm and self._window_tokens + tokens <= self.tpm:
+            return 0.0
+        return self._window[0][0] + WINDOW - now
+
+    def _pump(self):
+        now = time.monotonic()
+        self._trim_window(now)
+        while self._users and self._in_flight < self.max_concurrency:
+            user = self._users[0]
+            waiter, tokens, _ = self._queues[user][0]
+            delay = self._budget_delay(tokens, now)
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = self._loop.call_later(delay, self._on_timer)
+                return
+            self._queues[user].popleft()
+            self._users.rotate(-1)
+            if not self._queues[user]:
+                self._users.remove(user)
+                del self._queues[user]
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    async def _acquire(self, user, tokens, first=False):
+        self._loop = asyncio.get_running_loop()
+        waiter = self._loop.create_future()
+        entry = (waiter, tokens, time.monotonic())
+        queue = self._queues.get(user)
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._users.append(user)
+        if first:
+            queue.appendleft(entry)  # повтор после 429 не теряет место в очереди
+        else:
+            queue.append(entry)
+        self._pump()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            elif entry in queue:
+                queue.remove(entry)
+                if not queue:
+                    self._users.remove(user)
+                    del self._queues[user]
+            raise
+        self._waits.append(time.monotonic() - entry[2])
+
+    def _release(self):
+        self._in_flight -= 1
+        self._pump()
+
+    # --- публичный интерфейс ---------------------------------------------
+
+    async def run(self, tokens: int, call):
+        """Выполняет call() (корутину-фабрику) в рамках бюджетов.
+
+        На 429 — пауза всей очереди и повтор; на 5xx, таймаут и обрыв
+        соединения — пауза и повтор только этого запроса.
+        """
+        user = current_user.get()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(user, tokens, first=attempt > 0)
+            backoff = 0.0
+            try:
+                self.counters["requests"] += 1
+                return await call()
+            except RateLimitError as error:
+                self.counters["rate_limited"] += 1
+                if attempt == self.max_retries:
+                    raise
+                self._paused_until = max(self._paused_until, time.monotonic() + _retry_after(error, attempt))
+            except (APIStatusError, APIConnectionError) as error:
+                # APITimeoutError — подкласс APIConnectionError; прочие 4xx не повторяем
+                if isinstance(error, APIStatusError) and error.status_code < 500:
+                    raise
+                self.counters["server_errors"] += 1
+                if attempt == self.max_retries:
+                    raise
+                backoff = _retry_after(error, attempt)
+            finally:
+                self._release()
+            # Слот и место в окне на время паузы отдаём другим запросам
+            await asyncio.sleep(backoff)
+
+    def run_blocking(self, tokens: int, func):
+        """Для синхронного кода в пуле потоков: func() выполняется под тем же планировщиком.
+
+        Если планировщик ещё не работал в event loop (скрипт без бота) или вызов
+        пришёл из самого event loop — func() вызывается напрямую.
+        """
+        loop = self._loop
+        if loop is None or not loop.is_running() or _running_loop() is loop:
+            return func()
+
+        async def call():
+            return await asyncio.to_thread(func)
+
+        return asyncio.run_coroutine_threadsafe(self.run(tokens, call), loop).result()
+
+    async def coalesce(self, key, factory):
+        """Одна задача factory() на все одновременные вызовы с тем же key."""
+        task = self._coalesced.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            # shield: отмена одного из ожидающих не отменяет общую задачу
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(factory())
+        self._coalesced[key] = task
+        task.add_done_callback(lambda _: self._coalesced.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Метрики для мониторинга: глубина очередей, ожидание слота (с), окно бюджета."""
+        self._trim_window(time.monotonic())
+        waits = sorted(self._waits)
+        return {
+            "queue_depth": sum(len(queue) for queue in self._queues.values()),
+            "queue_by_user": {user: len(queue) for user, queue in self._queues.items()},
+            "in_flight": self._in_flight,
+            "requests_last_minute": len(self._window),
+            "tokens_last_minute": self._window_tokens,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            "wait_p50": statistics.median(waits) if waits else 0.0,
+            "wait_p90": waits[int(0.9 * (len(waits) - 1))] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+            **self.counters,
+        }
+
+
+llm_scheduler = LlmScheduler(LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES)
@@ -0,0 +1,59 @@
+import math
+import os
+import re
+from collections import Counter
+
+# Сколько страниц ПКО отдаётся в эмбеддинги и контекст модели (.env)
+PREFILTER_PAGES = int(os.getenv("PREFILTER_PAGES", "4"))
+
+_TOKEN = re.compile(r"\w+")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"(?<!\d)(?:\+?7|8)[\s\-()]*\d{3}[\s\-()]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)")
+
+# Слова, рядом с которыми в ПКО стоят ФИО, адрес и контакты (рус. и каз.)
+CLIENT_TERMS = (
+    "фио фамилия имя отчество дата рождения иин адрес адреса проживания регистрации "
+    "место жительства телефон тел мобильный домашний email почта электронная контакты "
+    "контактные данные субъект тегі аты әкесінің мекенжай тұрғылықты байланыс "
+    "<email> <phone>"
+).split()
+
+
+def tokenize(text: str):
+    """Слова в нижнем регистре; e-mail и телефоны дополнительно как <email> и <phone>."""
+    tokens = _TOKEN.findall(text.lower())
+    tokens += ["<email>"] * len(_EMAIL.findall(text))
+    tokens += ["<phone>"] * len(_PHONE.findall(text))
+    return tokens
+
+
+def bm25_scores(pages, query_tokens, k1=1.5, b=0.75):
+    """Оценки BM25 каждой страницы по набору слов запроса."""
+    docs = [Counter(tokenize(page)) for page in pages]
+    lengths = [sum(doc.values()) for doc in docs]
+    avg_length = sum(lengths) / len(docs) or 1
+    scores = [0.0] * len(docs)
+    for term in set(query_tokens):
+        df = sum(1 for doc in docs if term in doc)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc.get(term)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[i] / avg_length))
+    return scores
+
+
+def select_pages(pages, question: str, limit: int = PREFILTER_PAGES):
+    """Страницы, где вероятнее всего данные клиента, в исходном порядке.
+
+    Первая страница берётся всегда; остальные — лучшие (с ненулевой оценкой) по BM25 по словам
+    вопроса и CLIENT_TERMS. Таблицы договоров на длинных отчётах отсекаются
+    до запросов эмбеддингов.
+    """
+    if len(pages) <= limit:
+        return list(pages)
+    scores = bm25_scores(pages, tokenize(question) + CLIENT_TERMS)
+    best = sorted((i for i in range(1, len(pages)) if scores[i] > 0), key=lambda i: scores[i], reverse=True)[:limit - 1]
+    return [pages[i] for i in sorted([0] + best)]
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Меняется, когда меняется формат записей (PkoDocument, ContractIndex) — старые записи удаляются
+CACHE_FORMAT = 4
+# Временный файл старше этого (с) — остаток прерванной записи
+STALE_TMP_AGE = 3600
+
+
+def file_digest(filepath: str) -> str:
+    """SHA-256 содержимого файла — ключ кеша (имя файла и подпись не важны)."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    """SHA-256 содержимого PDF, скачанного в память (совпадает с file_digest)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def text_digest(text: str) -> str:
+    return bytes_digest(text.encode("utf-8"))
+
+
+def _remove(path: str):
+    # Файл мог уже удалить параллельный get/evict
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class PkoCache:
+    """Кеш результатов разбора ПКО на диске: один pickle-файл на SHA-256 PDF.
+
+    В записи хранятся версия ПКО, документ с индексом договоров, количество
+    действующих договоров и данные клиента (по хешу подписи). Записи старше
+    max_age секунд удаляются; при превышении max_bytes удаляются давно не
+    использованные.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._locks = {}  # digest -> [блокировка, сколько потоков её ждут или держат]
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _lock(self, digest: str):
+        # Блокировка живёт, пока запись кто-то обновляет, — словарь не растёт без предела
+        with self._locks_guard:
+            entry = self._locks.setdefault(digest, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[digest]
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}-{CACHE_FORMAT}.pkl")
+
+    def get(self, digest: str):
+        """Запись для PDF или None."""
+        path = self._path(digest)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                _remove(path)
+                return None
+            with open(path, "rb") as file:
+                entry = pickle.load(file)
+            os.utime(path)  # отмечаем использование для вытеснения
+            return entry
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Повреждённая или устаревшая по формату запись
+            _remove(path)
+            return None
+
+    def update(self, digest: str, **fields):
+        """Дополняет запись полями и атомарно записывает её на диск.
+
+        Чтение-изменение-запись одной записи идут под её блокировкой: вызовы
+        приходят из пула потоков, и без неё одно из обновлений теряется.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock(digest):
+            entry = self.get(digest) or {}
+            entry.update(fields)
+            # Свой временный файл на каждый вызов — потоки одного процесса не мешают друг другу
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._path(digest))
+            except BaseException:
+                _remove(tmp_path)
+                raise
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Удаляет просроченные записи, затем самые старые — пока кеш больше max_bytes.
+
+        Заодно удаляет временные файлы, оставшиеся от прерванных записей.
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((".pkl", ".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".tmp"):
+                if now - stat.st_mtime > STALE_TMP_AGE:
+                    _remove(path)
+            elif not name.endswith(f"-{CACHE_FORMAT}.pkl") or now - stat.st_mtime > self.max_age:
+                _remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+pko_cache = PkoCache(
+    directory=os.getenv("PKO_CACHE_DIR", "cache/pko"),
+    max_bytes=int(os.getenv("PKO_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    max_age=float(os.getenv("PKO_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+)
@@ -0,0 +1,77 @@
+import fitz
+
+
+def open_pdf(source):
+    """fitz-документ из пути к файлу или из содержимого PDF (bytes) — без записи на диск."""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+class PkoDocument:
+    """PDF ПКО, открытый один раз: текст каждой страницы извлекается и кешируется.
+
+    source — путь к файлу или содержимое PDF (bytes); сами байты не сохраняются.
+    """
+
+    def __init__(self, source):
+        doc = open_pdf(source)
+        try:
+            self.pages = [page.get_text() for page in doc]
+        finally:
+            doc.close()
+        self._full_text = None
+        self._cache = {}
+
+    @property
+    def first_page(self) -> str:
+        return self.pages[0] if self.pages else ""
+
+    @property
+    def full_text(self) -> str:
+        """Текст всех страниц подряд (как раньше собирали в циклах по doc)."""
+        if self._full_text is None:
+            self._full_text = "".join(self.pages)
+        return self._full_text
+
+    def cached(self, key, build, fresh=None):
+        """Результат build(self), посчитанный один раз на документ (например, индекс договоров).
+
+        fresh(значение) -> False — сохранённое значение устарело и строится заново.
+        """
+        if key not in self._cache or (fresh is not None and not fresh(self._cache[key])):
+            self._cache[key] = build(self)
+        return self._cache[key]
+
+    def peek(self, key):
+        """Уже посчитанное cached() значение или None — без построения."""
+        return self._cache.get(key)
+
+    def section(self, start_marker: str, end_marker: str) -> str:
+        """Текст страниц от страницы с start_marker до страницы с end_marker включительно."""
+        text = ""
+        in_block = False
+        for page_text in self.pages:
+            if start_marker in page_text:
+                in_block = True
+            if in_block:
+                text += page_text + "\n"
+            if end_marker in page_text and in_block:
+                break
+        return text
+
+
+def read_first_pages(source, count: int = 2):
+    """Текст только первых count страниц — без извлечения всего отчёта."""
+    doc = open_pdf(source)
+    try:
+        return [doc[i].get_text() for i in range(min(count, doc.page_count))]
+    finally:
+        doc.close()
+
+
+def as_pko_document(source) -> PkoDocument:
+    """Принимает путь к файлу, содержимое PDF или уже открытый PkoDocument."""
+    if isinstance(source, PkoDocument):
+        return source
+    return PkoDocument(source)
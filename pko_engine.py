@@ -0,0 +1,265 @@
+import re
+from contract import Contract, parse_amount, parse_date
+from contract_index import ContractIndex
+from creditor_matcher import creditor_matcher
+from pko_document import PkoDocument, as_pko_document
+
+# Все регулярные выражения компилируются один раз при импорте
+_SPACES_AND_QUOTES = re.compile(r'[\s«»"“”\n\t]+')
+_SPACES_AND_ZERO_WIDTH = re.compile(r'[\s\n\r\t\u200B\uFEFF]+')
+_LINE_BREAKS = re.compile(r'[\n\r\t]+')
+
+
+def normalize_text(text: str, lower: bool = True) -> str:
+    """Удаляет пробелы, переносы строк и кавычки для нормализации текста."""
+    if lower:
+        return _SPACES_AND_QUOTES.sub('', text.lower())
+    return _SPACES_AND_QUOTES.sub('', text)
+
+
+def normalize_compact(text: str) -> str:
+    """Удаляет пробелы, переносы и невидимые символы, сохраняет регистр."""
+    return _SPACES_AND_ZERO_WIDTH.sub('', text)
+
+
+def normalize_compact_lower(text: str) -> str:
+    """То же, что normalize_compact, но в нижнем регистре — для поиска названия компании."""
+    return _SPACES_AND_ZERO_WIDTH.sub('', text).lower()
+
+
+# Откуда берётся текст для поиска поля / ИИН / количества договоров
+def _first_page_no_spaces(pko):
+    return pko.first_page.replace("\n", "").replace(" ", "")
+
+
+def _all_pages_compact(pko):
+    return normalize_compact(pko.full_text)
+
+
+def _all_pages_one_line(pko):
+    return _LINE_BREAKS.sub(' ', pko.full_text)
+
+
+def _first_page(pko):
+    return pko.first_page
+
+
+TEXT_SOURCES = {
+    "first_page": _first_page,
+    "first_page_no_spaces": _first_page_no_spaces,
+    "all_pages_compact": _all_pages_compact,
+    "all_pages_one_line": _all_pages_one_line,
+}
+
+
+# Как превращать найденный текст в значение поля Contract
+CONVERTERS = {
+    "text": lambda value: value,
+    "amount": parse_amount,
+    "date": parse_date,
+}
+
+
+class Field:
+    """Поле договора: атрибут Contract, шаблон с одной группой и текст, по которому искать.
+
+    source="chunk" — исходный текст блока, "compact" — блок без пробелов и кавычек.
+    kind — "text", "amount" (Decimal) или "date" (datetime.date).
+    """
+
+    def __init__(self, name, pattern, source="chunk", kind="text", flags=0):
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.source = source
+        self.convert = CONVERTERS[kind]
+
+    def extract(self, texts):
+        match = self.regex.search(texts[self.source])
+        return self.convert(match.group(1).strip() if match else None)
+
+
+class PkoLayout:
+    """Описание одной версии ПКО и общий разбор по этому описанию.
+
+    Блок действующих договоров — страницы от start_marker до end_marker.
+    Если задан block_normalize, блок нормализуется целиком до деления на договоры.
+    Договоры — совпадения chunk_pattern, поля — список Field.
+    """
+
+    def __init__(self, version, detect_markers, start_marker, end_marker, chunk_pattern, fields,
+                 iin_pattern, iin_source, creditor_normalize, count_patterns, count_source,
+                 block_normalize=None, iin_flags=0, count_flags=0):
+        self.version = version
+        self.detect_markers = detect_markers
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self.chunk_regex = re.compile(chunk_pattern, re.DOTALL)
+        self.fields = fields
+        self.iin_regex = re.compile(iin_pattern, iin_flags)
+        self.iin_source = TEXT_SOURCES[iin_source]
+        self.creditor_normalize = creditor_normalize
+        self.count_regexes = [re.compile(pattern, count_flags) for pattern in count_patterns]
+        self.count_source = TEXT_SOURCES[count_source]
+        self.block_normalize = block_normalize
+        self._needs_compact = any(field.source == "compact" for field in fields)
+
+    def _parse(self, pko, matcher):
+        iin_match = self.iin_regex.search(self.iin_source(pko))
+        iin = iin_match.group(1) if iin_match else None
+
+        block = pko.section(self.start_marker, self.end_marker)
+        if self.block_normalize is not None:
+            block = self.block_normalize(block)
+
+        # Каждый блок нормализуется один раз, все поля ищутся по готовым строкам
+        contracts = []
+        for chunk in self.chunk_regex.findall(block):
+            texts = {"chunk": chunk}
+            if self._needs_compact:
+                texts["compact"] = normalize_text(chunk, False)
+            contract = Contract(iin=iin, **{field.name: field.extract(texts) for field in self.fields})
+            contracts.append((self.creditor_normalize(chunk), contract))
+
+        return ContractIndex(contracts, self.creditor_normalize, matcher)
+
+    def contract_index(self, pko) -> ContractIndex:
+        """Индекс действующих договоров отчёта (строится один раз на документ).
+
+        Документ с индексом лежит в кеше ПКО до 30 дней; если за это время
+        в базе поменялись search_field, индекс строится заново.
+        """
+        matcher = creditor_matcher(self.creditor_normalize)
+        return as_pko_document(pko).cached(("contracts", self.version), lambda doc: self._parse(doc, matcher),
+                                           fresh=lambda index: index.keys == tuple(matcher.keys))
+
+    def has_index(self, pko) -> bool:
+        """Индекс уже построен под текущую базу — contract_index() ничего не будет разбирать."""
+        index = as_pko_document(pko).peek(("contracts", self.version))
+        return index is not None and index.keys == tuple(creditor_matcher(self.creditor_normalize).keys)
+
+    def find_contract(self, pko, company_name: str):
+        """Первый действующий договор, в котором упоминается компания, или None."""
+        return self.contract_index(pko).find(company_name)
+
+    def count_active(self, pko) -> int:
+        """Количество действующих договоров из сводки отчёта."""
+        text = self.count_source(as_pko_document(pko))
+        total = 0
+        for regex in self.count_regexes:
+            match = regex.search(text)
+            total += int(match.group(1)) if match else 0
+        return total
+
+
+_DATE = r"(\d{2}\.\d{2}\.\d{4})"
+
+LAYOUTS = {
+    layout.version: layout
+    for layout in (
+        PkoLayout(
+            version="Новая версия(рус)",
+            detect_markers=(
+                "Действующие договоры без просрочки",
+                "Действующие договоры с просрочкой",
+                "ДЕЙСТВУЮЩИЕ ДОГОВОРА",
+            ),
+            start_marker="ДЕЙСТВУЮЩИЕ ДОГОВОРА",
+            end_marker="ЗАВЕРШЕННЫЕ ДОГОВОРА",
+            chunk_pattern=r"((?:Общая сумма кредита / валюта|Сумма кредитного лимита):.*?)(?=ЗАЛОГИ)",
+            fields=[
+                Field('number', r"Номердоговора:\s*(.*?)\s*(?:Датаначаласрокадействиядоговора|СОСТОЯНИЕ)", source="compact"),
+                Field('start_date', r'Дата начала[^0-9]*' + _DATE, kind="date"),
+                Field('end_date', r'Дата окончания[^0-9]*' + _DATE, kind="date"),
+                Field('total_amount', r"(?:Общая сумма кредита / валюта|Сумма кредитного лимита):\s*([^\n]+)", kind="amount"),
+                Field('overdue_amount', r"Сумма просроченных взносов:\s*([^\n]+)", kind="amount"),
+                Field('outstanding_amount', r"(?:Непогашенная сумма по кредиту|Использованная сумма \(подлежащая погашению\)):\s*([^\n]+)", kind="amount"),
+            ],
+            iin_pattern=r"ИИН:\s*(\d{12})",
+            iin_source="first_page_no_spaces",
+            creditor_normalize=normalize_text,
+            count_patterns=(
+                r"(\d+)\s*Действующие договоры без просрочки\*",
+                r"(\d+)\s*Действующие договоры с просрочкой\*",
+            ),
+            count_source="first_page",
+        ),
+        PkoLayout(
+            version="Старая версия(рус)",
+            detect_markers=("(ИИН)", "Заёмщик", "Действующие договора"),
+            start_marker="Действующие договора",
+            end_marker="Завершенные договора",
+            block_normalize=normalize_compact,
+            chunk_pattern=r"(Видфинансирования:.*?Дополнительнаяинформация)",
+            fields=[
+                Field('number', r"Номердоговора[:№]?\s*(.*?)\s*(?:Датазаявки|Состояние[:№]?)", flags=re.DOTALL),
+                Field('start_date', r"Датаначаласрокадействиядоговора[:№]?\s*" + _DATE, kind="date", flags=re.DOTALL),
+                Field('end_date', r"Датаокончаниясрокадействиядоговора[:№]?\s*" + _DATE, kind="date", flags=re.DOTALL),
+                Field('total_amount', r"Общаясуммакредита.?валюта[:№]?\s*([\d.,]+KZT)", kind="amount", flags=re.DOTALL),
+                Field('overdue_amount', r"Суммапериодическогоплатежа[:№]?\s*([\d.,]+KZT)", kind="amount", flags=re.DOTALL),
+                Field('outstanding_amount', r"Непогашеннаясуммапокредиту[:№]?\s*([\d.,]+KZT)", kind="amount", flags=re.DOTALL),
+            ],
+            iin_pattern=r"\(ИИН\).*?(\d{12})",
+            iin_source="all_pages_compact",
+            iin_flags=re.DOTALL,
+            creditor_normalize=normalize_compact_lower,
+            count_patterns=(r"Заёмщик\s*([0-9]+)\s*\(",),
+            count_source="all_pages_compact",
+        ),
+        PkoLayout(
+            version="Зеленая версия(каз)",
+            detect_markers=("ЖСН:", "Қолданыстағы міндеттемелер", "ҚОЛДАНЫСТАҒЫ ШАРТТАР"),
+            start_marker="ҚОЛДАНЫСТАҒЫ ШАРТТАР БОЙЫНША ТОЛЫҚ АҚПАРАТ",
+            end_marker="АЯҚТАЛҒАН ШАРТТАР",
+            chunk_pattern=r"(Міндеттеме.*?)(?=Мерзімін ұзартулар күні)",
+            fields=[
+                Field('number', r"Шартнөмірі:\s*(.*?)\s*Кредиткеөтінімберукүні:", source="compact"),
+                Field('start_date', r'Келісімшарттың қолданылу мерзімінің басталу күні[^0-9]*' + _DATE, kind="date"),
+                Field('end_date', r'Келісімшарттың қолданылу мерзімінің аяқталу күні[^0-9]*' + _DATE, kind="date"),
+                Field('total_amount', r"Ай сайынғы төлем сомасы / валюта:\s*([^\n]+)", kind="amount"),
+                Field('overdue_amount', r"Мерзімі өткен жарналар сомасы /валюта:\s*([^\n]+)", kind="amount"),
+                Field('outstanding_amount', r"Алдағы төлемдер сомасы/валюта\s*([^\n]+)", kind="amount"),
+            ],
+            iin_pattern=r"ЖСН:\s*(\d{12})",
+            iin_source="first_page_no_spaces",
+            creditor_normalize=normalize_text,
+            count_patterns=(r"Қолданыстағы\s+міндеттемелер\s*\((\d+)\)",),
+            count_source="all_pages_one_line",
+            count_flags=re.IGNORECASE,
+        ),
+        PkoLayout(
+            version="Зеленая версия(рус)",
+            detect_markers=("Действующие обязательства", "ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ"),
+            start_marker="ПОДРОБНАЯ ИНФОРМАЦИЯ ПО ДЕЙСТВУЮЩИМ ДОГОВОРАМ",
+            end_marker="ПОДРОБНАЯ ИНФОРМАЦИЯ О ЗАВЕРШЕННЫХ ДОГОВОРАХ",
+            chunk_pattern=r"(Обязательство.*?)(?=Дата пролонгации)",
+            fields=[
+                Field('number', r"Номердоговора:\s*(.*?)\s*Датазаявкинакредит:", source="compact"),
+                Field('start_date', r'Дата начала срока действия контракта[^0-9]*' + _DATE, kind="date"),
+                Field('end_date', r'Дата окончания срока действия контракта[^0-9]*' + _DATE, kind="date"),
+                Field('total_amount', r"Сумма ежемесячного платежа /валюта:\s*([^\n]+)", kind="amount"),
+                Field('overdue_amount', r"Сумма просроченных взносов /валюта:\s*([^\n]+)", kind="amount"),
+                Field('outstanding_amount', r"Сумма предстоящих платежей /валюта:\s*([^\n]+)", kind="amount"),
+            ],
+            iin_pattern=r"ИИН:\s*(\d{12})",
+            iin_source="first_page_no_spaces",
+            creditor_normalize=normalize_text,
+            count_patterns=(r"Действующие\s+обязательства\s*\((\d+)\)",),
+            count_source="all_pages_one_line",
+            count_flags=re.IGNORECASE,
+        ),
+    )
+}
+
+
+# Точки входа для пула процессов: принимают путь или содержимое PDF, возвращают пиклируемый результат
+def parse_document(source, version: str) -> PkoDocument:
+    """Открывает ПКО (или берёт уже открытый) и строит индекс договоров версии (он кешируется в документе)."""
+    pko = as_pko_document(source)
+    LAYOUTS[version].contract_index(pko)
+    return pko
+
+
+def index_document(source, version: str):
+    """parse_document и подсчёт действующих договоров за один заход в пул: (документ, количество)."""
+    pko = parse_document(source, version)
+    return pko, LAYOUTS[version].count_active(pko)
@@ -0,0 +1,24 @@
+from pko_document import PkoDocument, read_first_pages
+from pko_engine import LAYOUTS
+
+
+def detect_pko_version(source, pages: int = 2):
+    """Определяет версию ПКО по маркерам первых страниц (PkoLayout.detect_markers).
+
+    Возвращает название версии или None, если маркеров нет или версия неоднозначна —
+    тогда версию нужно спросить у пользователя.
+    """
+    if isinstance(source, PkoDocument):
+        text = "".join(source.pages[:pages])
+    else:
+        text = "".join(read_first_pages(source, pages))
+
+    scores = {
+        version: sum(1 for marker in layout.detect_markers if marker in text)
+        for version, layout in LAYOUTS.items()
+    }
+    best = max(scores.values())
+    if best == 0:
+        return None
+    winners = [version for version, score in scores.items() if score == best]
+    return winners[0] if len(winners) == 1 else None
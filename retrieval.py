@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Эмбеддинги одной float32-матрицей со строками единичной длины."""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def top_k(matrix: np.ndarray, query, k: int) -> np.ndarray:
+    """Индексы k строк нормированной матрицы, ближайших к query по косинусу, по убыванию.
+
+    Одно умножение матрицы на вектор и argpartition вместо полной сортировки.
+    """
+    if not len(matrix):
+        return np.zeros(0, dtype=np.intp)
+    query = normalize_rows(query)[0]
+    scores = matrix @ query
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
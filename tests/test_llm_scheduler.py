@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import BadRequestError, InternalServerError
+
+from llm_scheduler import LlmScheduler
+
+
+def _response(status):
+    return httpx.Response(status, request=httpx.Request("POST", "https://api.openai.test/v1/chat/completions"))
+
+
+def _failing(errors, result="ok"):
+    """Корутина-фабрика: первые вызовы бросают errors по очереди, затем возвращают result."""
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return call, calls
+
+
+def test_server_error_is_retried():
+    scheduler = LlmScheduler(rpm=100, tpm=100000, max_concurrency=2, max_retries=2)
+    call, calls = _failing([InternalServerError("boom", response=_response(500), body=None)])
+
+    assert asyncio.run(scheduler.run(10, call)) == "ok"
+    assert len(calls) == 2
+    assert scheduler.counters["server_errors"] == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_client_error_is_not_retried():
+    scheduler = LlmScheduler(rpm=100, tpm=100000, max_concurrency=2, max_retries=2)
+    call, calls = _failing([BadRequestError("bad", response=_response(400), body=None)])
+
+    with pytest.raises(BadRequestError):
+        asyncio.run(scheduler.run(10, call))
+    assert len(calls) == 1